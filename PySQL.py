@@ -1,9 +1,30 @@
 import pandas as pd
-from datetime import datetime
-from sqlalchemy import create_engine, types, MetaData, Table, select, delete, and_, Column, PrimaryKeyConstraint
+from datetime import datetime, date
+import decimal
+from sqlalchemy import create_engine, inspect, text, func, types, MetaData, Table, select, delete, and_, Column, PrimaryKeyConstraint
 from sqlalchemy.exc import NoSuchTableError, NoSuchColumnError
 from sqlalchemy import schema as sqlalchemy_schema
+from sqlalchemy import sql as sqlalchemy_sql
+from sqlalchemy.dialects import mssql
 import numpy as np
+import operator
+import ast
+import json
+import re
+import atexit
+import csv
+import queue
+import threading
+import contextlib
+import asyncio
+import functools
+import weakref
+import os
+import time
+import uuid
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import warnings
 warnings.simplefilter(action='ignore', category=UserWarning)
 
@@ -11,21 +32,114 @@ class Table_analyzer():
     def __init__(self):
         pass
     
-    def analyze_column_dtype(self, df, column_name):
+    def profile_column(self, column_data):
+        """
+        profiling a column in one vectorized pass (null count, bool-like values, integral-ness, min/max and text lengths).
+
+        Args:
+            column_data (pandas series): the column you needs to be profiled.
+        Returns:
+            dict: column's profile - count/null_count/dtype/is_bool/is_integral/min/max/max_utf8_length/max_utf16_length/sample
+                  (is_integral is None when values can't be converted to int, sample is up to 100 random non-null values)
+        """
+        null_mask = column_data.isna()
+        non_null_values = column_data[~null_mask]
+        sample = non_null_values.sample(n=100) if len(non_null_values) > 100 else non_null_values.sample(n=len(non_null_values))
+        profile = {'count': len(non_null_values), 'null_count': int(null_mask.sum()), 'dtype': non_null_values.dtype,
+                   'is_bool': True, 'is_integral': True, 'min': None, 'max': None, 'max_utf8_length': None, 'max_utf16_length': None,
+                   'sample': sample.reset_index(drop=True)}
+        if len(non_null_values) == 0:
+            return profile
+
+        dtype = non_null_values.dtype
+        # text lengths of numbers/dates are kept too, chunks of a mixed csv column can be parsed as numbers or texts (Table_analyzer.merge_profiles)
+        if pd.api.types.is_bool_dtype(dtype):
+            values = non_null_values.to_numpy(dtype=bool)
+            profile.update({'min': bool(values.min()), 'max': bool(values.max())})
+            max_length = 5 if not profile['min'] else 4     # False/True
+            profile.update({'max_utf8_length': max_length, 'max_utf16_length': 2 * max_length})
+            return profile
+
+        if pd.api.types.is_integer_dtype(dtype):
+            values = non_null_values.to_numpy(dtype=dtype.numpy_dtype if hasattr(dtype, 'numpy_dtype') else dtype)
+            profile.update({'min': values.min(), 'max': values.max()})
+            profile['is_bool'] = bool(profile['min'] >= 0 and profile['max'] <= 1)
+            max_length = max(len(str(profile['min'])), len(str(profile['max'])))
+            profile.update({'max_utf8_length': max_length, 'max_utf16_length': 2 * max_length})
+            return profile
+
+        if pd.api.types.is_float_dtype(dtype):
+            values = non_null_values.to_numpy(dtype=dtype.numpy_dtype if hasattr(dtype, 'numpy_dtype') else dtype)
+            profile['is_bool'] = False    # str() of a float is never one of the bool representations
+            profile.update({'min': values.min(), 'max': values.max()})
+            if np.isfinite(values).all():
+                profile['is_integral'] = bool((values == np.floor(values)).all())
+            else:
+                profile['is_integral'] = None
+            max_length = int(np.char.str_len(pd.unique(values).astype(str)).max())
+            profile.update({'max_utf8_length': max_length, 'max_utf16_length': 2 * max_length})
+            return profile
+
+        if pd.api.types.is_datetime64_any_dtype(dtype) or pd.api.types.is_timedelta64_dtype(dtype):
+            profile.update({'is_bool': False, 'is_integral': None, 'min': non_null_values.min(), 'max': non_null_values.max()})
+            max_length = max(len(str(profile['min'])), len(str(profile['max'])))
+            profile.update({'max_utf8_length': max_length, 'max_utf16_length': 2 * max_length})
+            return profile
+
+        # object/string/category columns --> working on unique values only
+        values = non_null_values.to_numpy(dtype=object)
+        try:
+            uniques = pd.unique(values)
+        except TypeError:   # unhashable cells
+            uniques = values
+        inferred = pd.api.types.infer_dtype(values, skipna=False)
+
+        # bool-like check (values that compare equal but print differently, e.g. 1/1.0/True, are only merged for homogeneous columns)
+        if inferred == 'boolean':
+            profile['is_bool'] = True
+        elif inferred in ('string', 'integer', 'floating'):
+            profile['is_bool'] = bool(pd.Series(uniques.astype(str)).str.lower().isin(['true', 'false', '1', '0']).all())
+        else:
+            texts = pd.unique(values.astype(str))
+            profile['is_bool'] = bool(pd.Series(texts).str.lower().isin(['true', 'false', '1', '0']).all())
+
+        # integral check and min/max
+        try:
+            if inferred in ('integer', 'floating', 'mixed-integer-float'):
+                numbers = uniques.astype(float)
+                if not np.isfinite(numbers).all():
+                    raise OverflowError('cannot convert float infinity to integer')
+                profile['is_integral'] = bool((numbers == np.floor(numbers)).all())
+            else:
+                profile['is_integral'] = all([value == int(value) for value in uniques])
+            profile.update({'min': min(uniques), 'max': max(uniques)})
+        except Exception:
+            profile['is_integral'] = None
+
+        # text lengths in bytes (SQL Server NVARCHAR stores UTF-16)
+        texts = uniques if inferred == 'string' else pd.unique(values.astype(str))
+        if ''.join(texts).isascii():
+            max_length = max(map(len, texts))
+            profile.update({'max_utf8_length': max_length, 'max_utf16_length': 2 * max_length})
+        else:
+            profile['max_utf8_length'] = max(map(len, map(str.encode, texts)))
+            profile['max_utf16_length'] = max(map(len, map(operator.methodcaller('encode', 'utf-16-le'), texts)))
+        return profile
+
+    def analyze_column_dtype(self, df, column_name, profile=None):
         """
          analyzing dtypes for storing data in SQL Server.
 
         Args:
             df (pandas dataframe): A dataframe which its column dtypes needs to be analyzed.
             columnName (str): the column you needs to be analyzed.
+            profile (dict, optional): column profile created by Table_analyzer.profile_column (default is None --> profiles the column)
+                                      df can be None when profile is given
         Returns:
             str: column's dtype - BIT/INT/FLOAT/DATE/TEXT 
         """
         def date_has_time(column_data):
-            for date in column_data:
-                if date.hour != 0:
-                    return True
-            return False
+            return bool((column_data.dt.hour != 0).any())
 
         def can_convert_to_datetime(column_data):
             try:
@@ -36,41 +150,38 @@ class Table_analyzer():
                 if date_has_time(column_data):
                     return "DATETIME"
                 return "DATE"
-            except ValueError:
+            except (ValueError, TypeError):    # TypeError: non-text objects, e.g. python bools of an object column
                 return False
             
-        column_data = df[column_name]
-        non_null_values = column_data.dropna()
+        if profile is None:
+            profile = self.profile_column(df[column_name])
 
         # Check if the column contains only boolean values (including different representations)
-        is_bool = non_null_values.apply(lambda x: str(x).lower() in ['true', 'false', '1', '0'])
-        if is_bool.all():
+        if profile['is_bool']:
             return "BIT"
         
         # Check if the column contains all integer values with null cells
-        if non_null_values.dtype == np.int64:
-            if column_data.isnull().any():
+        if profile['dtype'] == np.int64:
+            if profile['null_count'] > 0:
                 return "INT"
 
         # Check if the column contains integers or floats that can be considered integers
-        try:
-            if non_null_values.apply(lambda x: x == int(x)).all():
-                if max(non_null_values) > 2_000_000_000:
+        if profile['is_integral'] is not None:
+            if profile['is_integral']:
+                if profile['max'] > 2_000_000_000:
                     return "BIGINT"
                 return "INT"
             return "FLOAT"
-        except:
-            pass
 
         # Check if the column contains datetime values
-        can_be_dtime = can_convert_to_datetime(non_null_values)
+        can_be_dtime = can_convert_to_datetime(profile['sample'])
         if can_be_dtime:
             return can_be_dtime
 
         # If none of the above, return TEXT
         return "TEXT"
 
-    def calculate_n_value(self, df, column_name, buffer=20, max_length=4000):
+    def calculate_n_value(self, df, column_name, buffer=20, max_length=4000, profile=None):
         """
         Calculate the suitable n value for storing nvarchar data in SQL Server.
 
@@ -79,15 +190,16 @@ class Table_analyzer():
             columnName (str): the column what its n needs to be calculated.
             buffer (int/float, optional): A buffer to account for future growth/ (under 1 --> percentage of growth) (default is 20).
             max_length (int, optional): The maximum length allowed for nvarchar columns in SQL Server (default is 4000).
+            profile (dict, optional): column profile created by Table_analyzer.profile_column (default is None --> profiles the column)
 
         Returns:
             int: The calculated n value.
         """
-        column_data = df[column_name]
-        non_null_values = column_data.dropna()
+        if profile is None:
+            profile = self.profile_column(df[column_name])
 
         # Calculate the maximum length of the texts in the list
-        max_text_length = max(len(text.encode()) for text in non_null_values)
+        max_text_length = profile['max_utf8_length']
 
         # Calculate the suitable n value considering the buffer and the max_length constraint
         if 0 <= buffer < 1:
@@ -99,12 +211,101 @@ class Table_analyzer():
             
         return n_value
     
-    def analyze(self, df, texts_buffer=20, texts_max_length=4000, pre_analysed_dict={}):
+    def merge_profiles(self, profile, other):
         """
-        analyzing for optim dtypes to store data in SQL Server.
+        merging two profiles of the same column (e.g. from two chunks of a file) --> widest type wins, running min/max and max lengths.
+        the result is same as profiling both parts together when the parts have the same dtype (or int/float parts of a numeric column),
+        number/date parts of a text column add the lengths of their printed values (e.g. codes parsed as int64 in some csv chunks only)
 
         Args:
-            df (pandas dataframe): A dataframe needs to be analyzed.
+            profile (dict): column profile created by Table_analyzer.profile_column
+            other (dict): another profile of the same column
+
+        Returns:
+            dict: merged profile
+        """
+        def merge_values(function, *values):
+            values = [value for value in values if value is not None]
+            if not values:
+                return None
+            try:
+                return function(values)
+            except TypeError:   # not comparable (e.g. numbers and texts)
+                return None
+
+        def merge_samples(sample, count, other_sample, other_count, n=100):
+            if count + other_count <= n:
+                return pd.concat([sample, other_sample], ignore_index=True)
+            n_sample = min(np.random.binomial(n, count / (count + other_count)), len(sample))
+            n_other = min(n - n_sample, len(other_sample))
+            return pd.concat([sample.sample(n=n_sample), other_sample.sample(n=n_other)], ignore_index=True)
+
+        merged = dict(profile)
+        merged['count'] = profile['count'] + other['count']
+        merged['null_count'] = profile['null_count'] + other['null_count']
+        bool_parts = [pd.api.types.is_bool_dtype(part['dtype']) for part in (profile, other)]
+        if profile['dtype'] == other['dtype']:
+            merged['dtype'] = profile['dtype']
+        elif any(bool_parts) and not all(bool_parts):
+            # True/False next to numbers is a text column in the whole file (np.result_type would give a number dtype)
+            merged['dtype'] = np.dtype(object)
+        else:
+            try:
+                merged['dtype'] = np.result_type(profile['dtype'], other['dtype'])
+            except TypeError:
+                merged['dtype'] = np.dtype(object)
+        merged['min'] = merge_values(min, profile['min'], other['min'])
+        merged['max'] = merge_values(max, profile['max'], other['max'])
+        merged['max_utf8_length'] = merge_values(max, profile['max_utf8_length'], other['max_utf8_length'])
+        merged['max_utf16_length'] = merge_values(max, profile['max_utf16_length'], other['max_utf16_length'])
+        samples = [profile['sample'], other['sample']]
+        if merged['dtype'] == object:     # every part of a text column is sampled as texts, like a text column of the whole file
+            samples = [sample.astype(str) if len(sample) else sample for sample in samples]
+        merged['sample'] = merge_samples(samples[0], profile['count'], samples[1], other['count'])
+        if profile['is_integral'] is None or other['is_integral'] is None:
+            merged['is_integral'] = None
+        elif merged['dtype'] == object and any(bool_parts):
+            merged['is_integral'] = None      # 'True'/'False' texts are not integers
+        else:
+            merged['is_integral'] = profile['is_integral'] and other['is_integral']
+
+        # int chunks inside a float column (chunks without nulls) are printed as floats in the whole column
+        if merged['count'] == 0:
+            merged['is_bool'] = True
+        elif pd.api.types.is_float_dtype(merged['dtype']):
+            merged['is_bool'] = False
+        elif pd.api.types.is_integer_dtype(merged['dtype']):
+            merged['is_bool'] = bool(merged['min'] >= 0 and merged['max'] <= 1)
+        else:
+            merged['is_bool'] = profile['is_bool'] and other['is_bool']
+        return merged
+
+    def profile_columns(self, df, columns=None, n_jobs=1):
+        """
+        profiling dataframe columns, in parallel processes if n_jobs > 1.
+
+        Args:
+            df (pandas dataframe): A dataframe needs to be profiled.
+            columns (list, optional): columns to profile (default is None --> all columns)
+            n_jobs (int, optional): number of worker processes (default is 1 --> no process pool)
+
+        Returns:
+            dict: {column_name: profile}
+        """
+        columns = list(df.columns) if columns is None else list(columns)
+        if n_jobs is not None and n_jobs > 1 and len(columns) > 1:
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                profiles = list(executor.map(self.profile_column, [df[column] for column in columns]))
+        else:
+            profiles = [self.profile_column(df[column]) for column in columns]
+        return dict(zip(columns, profiles))
+
+    def analyze_profiles(self, profiles, texts_buffer=20, texts_max_length=4000, pre_analysed_dict={}):
+        """
+        creating sqlalchemy dtypes from column profiles.
+
+        Args:
+            profiles (dict): {column_name: profile} created by Table_analyzer.profile_columns / merge_profiles
             texts_buffer (int/float, optional): A buffer to account for future growth/ (under 1 --> percentage of growth) (default is 20).
             texts_max_length (int, optional): The maximum length allowed for nvarchar columns in SQL Server (default is 4000).
             pre_analysed_dict (dict): manually created columns dtype / sample --> {'column_name' : sqlalchemy.types.VARCHAR(length=25)}
@@ -112,11 +313,11 @@ class Table_analyzer():
         Returns:
             dict: analysed_dict (input param for pysql.to_sql)
         """
-        for column in df.columns:
+        for column, profile in profiles.items():
             if column not in pre_analysed_dict.keys():
-                detected_type = self.analyze_column_dtype(df, column)
+                detected_type = self.analyze_column_dtype(None, column, profile=profile)
                 if detected_type == 'TEXT':
-                    n_value = self.calculate_n_value(df, column, buffer=texts_buffer, max_length=texts_max_length)
+                    n_value = self.calculate_n_value(None, column, buffer=texts_buffer, max_length=texts_max_length, profile=profile)
                     pre_analysed_dict[column] = types.NVARCHAR(length=n_value)
                 elif detected_type == 'INT':
                     pre_analysed_dict[column] = types.INT()
@@ -132,222 +333,1359 @@ class Table_analyzer():
                     pre_analysed_dict[column] = types.DATETIME()
         return pre_analysed_dict
 
+    def analyze(self, df, texts_buffer=20, texts_max_length=4000, pre_analysed_dict={}, n_jobs=1):
+        """
+        analyzing for optim dtypes to store data in SQL Server.
 
-class PySQL():
-    def __init__(self):
-        self.log_dtypes =  {'function':types.VARCHAR(50), 'state':types.VARCHAR(50), 'log':types.VARCHAR(2000), 'connection_user':types.VARCHAR(50), 'process_id':types.INT(), 'datetime':types.DATETIME()}
-        self.dtypes_types = {'table':types.VARCHAR(50), 'schema':types.VARCHAR(50), 'dtypes_str':types.VARCHAR(4000), 'process_id':types.INT()}
-        self.process_id = -1
-        self.dtypes = {}
-        
-    def _log_decorator(func):  
-        def wrapper(self, *args, **kwargs):
-            try:
-                self.process_id += 1
-                self.logger(func.__name__ , 'start', 'success')
-                func_result = func(self, *args, **kwargs)
-                self.logger(func.__name__ , 'end', 'success')
-                return func_result
-            except Exception as Error:
-                print(Error)
-                self.logger(func.__name__ , 'progress', str(Error))
-        return wrapper    
-    
-    def logger(self, func, state, log):
+        Args:
+            df (pandas dataframe): A dataframe needs to be analyzed.
+            texts_buffer (int/float, optional): A buffer to account for future growth/ (under 1 --> percentage of growth) (default is 20).
+            texts_max_length (int, optional): The maximum length allowed for nvarchar columns in SQL Server (default is 4000).
+            pre_analysed_dict (dict): manually created columns dtype / sample --> {'column_name' : sqlalchemy.types.VARCHAR(length=25)}
+            n_jobs (int, optional): number of processes to profile columns in parallel (default is 1)
+
+        Returns:
+            dict: analysed_dict (input param for pysql.to_sql)
         """
-        basic logging system by PySQL 
-        stores in 'config' schema and 'log' table
-        connection_user, process_id and datetime joins via your input params automaticly
+        columns = [column for column in df.columns if column not in pre_analysed_dict.keys()]
+        profiles = self.profile_columns(df, columns, n_jobs=n_jobs)
+        return self.analyze_profiles(profiles, texts_buffer=texts_buffer, texts_max_length=texts_max_length, pre_analysed_dict=pre_analysed_dict)
+
+    def analyze_chunks(self, chunks, texts_buffer=20, texts_max_length=4000, pre_analysed_dict={}, n_jobs=1):
+        """
+        analyzing an iterator of dataframes (e.g. pd.read_csv(..., chunksize=100_000)) without loading all of them in memory.
+        each chunk is profiled and merged into running column profiles, so memory use depends on chunk size only.
+        result is same as Table_analyzer.analyze on the whole data (number chunks of a text column count their printed lengths, pass dtype= to read_csv to keep leading zeros)
 
         Args:
-            func (function object): an function (it's need to have __name__ variable')
-            state (str): any thing but start/stop/progress is suggested
-            log (str): log string
-            
+            chunks (iterable): dataframes with the same columns
+            texts_buffer (int/float, optional): A buffer to account for future growth/ (under 1 --> percentage of growth) (default is 20).
+            texts_max_length (int, optional): The maximum length allowed for nvarchar columns in SQL Server (default is 4000).
+            pre_analysed_dict (dict): manually created columns dtype / sample --> {'column_name' : sqlalchemy.types.VARCHAR(length=25)}
+            n_jobs (int, optional): number of processes to profile columns of every chunk in parallel (default is 1)
+
         Returns:
-            None
+            dict: analysed_dict (input param for pysql.to_sql)
         """
-        if len(log)> 2000:
-            log = log[:1999]
-        if 'config' not in self.engine.dialect.get_schema_names(self.engine):  # check for config schema
-            self.engine.execute(sqlalchemy_schema.CreateSchema('config'))
-            print('config schema not exist! \n new created!')
-        now = datetime.now().isoformat().replace('T', ' ').split('.')[0]
-        log_data = {'function':func, 'state':state, 'log':log,'connection_user':self.username ,'process_id':self.process_id, 'datetime':now}
-        self.log_data = pd.DataFrame([log_data])
-        self.log_data.to_sql('log', con=self.engine, schema='config', if_exists='append', dtype=self.log_dtypes, index=False)
-        
-    def create_connection(self, server, database, username, password, port=1433):
+        profiles = {}
+        for chunk in chunks:
+            columns = [column for column in chunk.columns if column not in pre_analysed_dict.keys()]
+            for column, profile in self.profile_columns(chunk, columns, n_jobs=n_jobs).items():
+                profiles[column] = self.merge_profiles(profiles[column], profile) if column in profiles else profile
+        return self.analyze_profiles(profiles, texts_buffer=texts_buffer, texts_max_length=texts_max_length, pre_analysed_dict=pre_analysed_dict)
+
+
+class Metadata_cache():
+    def __init__(self, engine, ttl=300):
         """
-        creates a pysql.engine connection to your target database
-        in order to have best experience to use, your sql_user(username) must to have datawriter, datareader and ddladmin 
+        engine scoped cache of database metadata (schemas, tables and reflected columns)
+        entries expire after ttl seconds, PySQL updates it after its own DDLs
+
         Args:
-            server (str): your host server (ip)
-            database (str): target database
-            username (str): username 
-            password (str): password 
-            port (str): connection port default : 1433
-            
+            engine (sqlalchemy engine): target database engine
+            ttl (int/float, optional): seconds to keep entries (default is 300, None --> never expire)
+        """
+        self.engine = engine
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.schemas = None          # (set of schema names, load time)
+        self.tables = {}             # {schema: (set of table names, load time)}
+        self.columns = {}            # {(schema, table): (list of column dicts, load time)}
+        self.primary_keys = {}       # {(schema, table): (list of key columns, load time)}
+        self.lock = threading.RLock()
+
+    def _is_fresh(self, entry):
+        return entry is not None and (self.ttl is None or time.monotonic() - entry[1] < self.ttl)
+
+    def _lookup(self, entry, loader, found=None):
+        # returns cached value (hit) or reloaded value (miss), found checks a cached value before trusting it
+        if self._is_fresh(entry) and (found is None or found(entry[0])):
+            self.hits += 1
+            return entry[0], False
+        self.misses += 1
+        return loader(), True
+
+    def schema_names(self, schema=None):
+        """
+        Returns schema names of the database
+
+        Args:
+            schema (str, optional): the schema which is needed, if it's not in cached names they're reloaded
+
         Returns:
-            None
+            set: schema names
         """
-        self.server = server
-        self.database = database
-        self.username = username
-        self.password = password
-        self.port = port
-        self.connection_str = f"mssql+pyodbc://{self.username}:{self.password}@{self.server}:{self.port}/{self.database}?driver=ODBC+Driver+17+for+SQL+Server"
-        self.engine = create_engine(self.connection_str)
-        self.logger('create_connection', 'success', 'connected')
-        self.lastlog = self.read_sql_table('log', schema='config', columns=['process_id'])
-        self.process_id = self.lastlog.process_id.values.tolist()
-        self.process_id = max([int(i) for i in self.process_id])
+        with self.lock:
+            found = None if schema is None else (lambda names: schema in names)
+            names, loaded = self._lookup(self.schemas, lambda: set(inspect(self.engine).get_schema_names()), found)
+            if loaded:
+                self.schemas = (names, time.monotonic())
+            return names
 
-    @_log_decorator 
-    def to_sql(self, df, table_name, schema=None, if_exists='append', index=True, index_label=None, primary_key=None, chunksize=1, date_normalizer=True, text_cutter=True):
+    def has_schema(self, schema):
+        if schema is None:
+            return True
+        return schema in self.schema_names(schema)
+
+    def add_schema(self, schema):
+        with self.lock:
+            if self._is_fresh(self.schemas):
+                self.schemas[0].add(schema)
+
+    def table_names(self, schema=None, table_name=None):
         """
-        Write records stored in a DataFrame to a SQL database.
-    
-        Parameters
-        ----------
-        df : DataFrame, Series
-        table_name : str
-            Name of SQL table.
-        schema : str, optional
-            Name of SQL schema in database to write to (if database flavor
-            supports this). If None, use default schema (default).
-        if_exists : {'fail', 'replace', 'append'}, default 'fail'
-            - fail: If table exists, do nothing.
-            - replace: If table exists, drop it, recreate it, and insert data.
-            - append: If table exists, insert data. Create if does not exist.
-        index : bool, default True
-            Write DataFrame index as a column.
-        index_label : str or sequence, optional
-            Column label for index column(s). If None is given (default) and
-            `index` is True, then the index names are used.
-            A sequence should be given if the DataFrame uses MultiIndex.
-        primary_key : str , optional
-            it uses pysql.set_primary_key so :
-            just one time allowed (if PK exists error!)
-            PK must be unique in every rows   
-        chunksize : int, optional
-            Specify the number of rows in each batch to be written at a time.
-            By default, all rows will be written at once.
-        date_normalizer : bool, default True
-            its run PySQL.date_normalizer and make date formats storable foe sql server
-    
-    
-            .. versionadded:: 1.3.0
-    
-        **engine_kwargs
-            Any additional kwargs are passed to the engine.
-    
-        Returns
-        -------
-        None or int
-            Number of rows affected by to_sql. None is returned if the callable
-            passed into ``method`` does not return the number of rows.
+        Returns table names of a schema
+
+        Args:
+            schema (str, optional): target schema name default=None
+            table_name (str, optional): the table which is needed, if it's not in cached names they're reloaded
+
+        Returns:
+            set: table names
         """
-        if schema!= None:
-            if schema not in self.engine.dialect.get_schema_names(self.engine):  # check for schema existance
-                self.engine.execute(sqlalchemy_schema.CreateSchema(schema))
-        df['process_id'] = [self.process_id]*len(df)
-        self.dtypes = self.dtypes | {'process_id':types.INT()}
-        if date_normalizer:
-            df = self.date_normalizer(df)
-        if text_cutter:
-            df = self.text_cutter(df)
-        
-        self.df = df
-        row_number = df.to_sql(name=table_name, con=self.engine, schema=schema, if_exists=if_exists, index=index, index_label=index_label, dtype=self.dtypes, chunksize=chunksize)
+        with self.lock:
+            found = None if table_name is None else (lambda names: table_name in names)
+            names, loaded = self._lookup(self.tables.get(schema), lambda: set(inspect(self.engine).get_table_names(schema=schema)), found)
+            if loaded:
+                self.tables[schema] = (names, time.monotonic())
+            return names
 
-        if primary_key != None:
-            self.set_primary_key(table_name=table_name, schema=schema, column_name=primary_key)
-        return row_number
-    
-    @_log_decorator
-    def tables_list(self, schema=None):
+    def has_table(self, table_name, schema=None):
+        return table_name in self.table_names(schema, table_name=table_name)
+
+    def add_table(self, table_name, schema=None):
+        with self.lock:
+            if self._is_fresh(self.tables.get(schema)):
+                self.tables[schema][0].add(table_name)
+            self.columns.pop((schema, table_name), None)
+            self.primary_keys.pop((schema, table_name), None)
+
+    def get_columns(self, table_name, schema=None):
         """
-        Returns table list of schemas
-        
+        Returns reflected column definitions of a table (sqlalchemy inspector.get_columns)
+
         Args:
-            schema (str): target schema name default=None
-            
+            table_name (str): target table name
+            schema (str, optional): target schema name default=None
+
         Returns:
-            list: list of table names
+            list: column dicts (name, type, nullable, ...)
         """
-        return self.engine.table_names(schema=schema)
-    
-    @_log_decorator 
-    def read_sql_table(self, table_name, schema=None, index_col=None, coerce_float=True, parse_dates=None, columns=None, chunksize=None):
+        with self.lock:
+            columns, loaded = self._lookup(self.columns.get((schema, table_name)), lambda: inspect(self.engine).get_columns(table_name, schema=schema))
+            if loaded:
+                self.columns[(schema, table_name)] = (columns, time.monotonic())
+            return columns
+
+    def get_primary_key(self, table_name, schema=None):
         """
-        Read SQL database table into a DataFrame.
-    
-        Given a table name , returns a DataFrame.
-        This function does not support DBAPI connections.
-    
-        Parameters
-        ----------
-        table_name : str
-            Name of SQL table in database.
-        schema : str, default None
-            Name of SQL schema in database to query (if database flavor
-            supports this). Uses default schema if None (default).
-        index_col : str or list of str, optional, default: None
-            Column(s) to set as index(MultiIndex).
-        coerce_float : bool, default True
-            Attempts to convert values of non-string, non-numeric objects (like
-            decimal.Decimal) to floating point. Can result in loss of Precision.
-        parse_dates : list or dict, default None
-            - List of column names to parse as dates.
-            - Dict of ``{column_name: format string}`` where format string is
-              strftime compatible in case of parsing string times or is one of
-              (D, s, ns, ms, us) in case of parsing integer timestamps.
-            - Dict of ``{column_name: arg dict}``, where the arg dict corresponds
-              to the keyword arguments of :func:`pandas.to_datetime`
-              Especially useful with databases without native Datetime support,
-              such as SQLite.
-        columns : list, default None
-            List of column names to select from SQL table.
-        chunksize : int, default None
-            If specified, returns an iterator where `chunksize` is the number of
-            rows to include in each chunk.
-    
-        Returns
-        -------
-        DataFrame or Iterator[DataFrame]
-            A SQL table is returned as two-dimensional data structure with labeled
-            axes.
-    
-        See Also
-        --------
-        read_sql_query : Read SQL query into a DataFrame.
-    
-        Notes
-        -----
-        Any datetime values with time zone information will be converted to UTC.
-    
-        Examples
-        --------
-        >>> pysql.read_sql_table('table_name')
+        Returns primary key columns of a table
+
+        Args:
+            table_name (str): target table name
+            schema (str, optional): target schema name default=None
+
+        Returns:
+            list: key column names (empty if table has no primary key)
         """
-        return pd.read_sql_table(table_name, con=self.engine, schema=schema, index_col=index_col, coerce_float=coerce_float, parse_dates=parse_dates, columns=columns, chunksize=chunksize)
-    
-    @_log_decorator
-    def read_sql_query(self, query, index_col=None, coerce_float=True, params=None, parse_dates=None, chunksize=None, dtype=None):
+        with self.lock:
+            loader = lambda: inspect(self.engine).get_pk_constraint(table_name, schema=schema).get('constrained_columns') or []
+            keys, loaded = self._lookup(self.primary_keys.get((schema, table_name)), loader)
+            if loaded:
+                self.primary_keys[(schema, table_name)] = (keys, time.monotonic())
+            return keys
+
+    def invalidate(self, schema=None, table_name=None):
         """
-        Read SQL query into a DataFrame.
-    
-        Returns a DataFrame corresponding to the result set of the query
-        string. Optionally provide an `index_col` parameter to use one of the
-        columns as the index, otherwise default integer index will be used.
-    
-        Parameters
-        ----------
-        query : str SQL query or SQLAlchemy Selectable (select or text object)
-            SQL query to be executed.
-        index_col : str or list of str, optional, default: None
-            Column(s) to set as index(MultiIndex).
+        drops cached entries
+            -no args: everything
+            -schema: the schema tables and columns (and schema names)
+            -schema and table_name: the table columns and primary key
+
+        Returns:
+            None
+        """
+        with self.lock:
+            if table_name is not None:
+                self.columns.pop((schema, table_name), None)
+                self.primary_keys.pop((schema, table_name), None)
+                if schema in self.tables:
+                    self.tables[schema][0].discard(table_name)
+                return
+            if schema is None:
+                self.tables = {}
+                self.columns = {}
+                self.primary_keys = {}
+            else:
+                self.tables.pop(schema, None)
+                self.columns = {key: value for key, value in self.columns.items() if key[0] != schema}
+                self.primary_keys = {key: value for key, value in self.primary_keys.items() if key[0] != schema}
+            self.schemas = None
+
+    def stats(self):
+        """
+        Returns hit/miss counters and cached entries count
+
+        Returns:
+            dict: hits, misses, hit_ratio, schemas, tables, columns
+        """
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_ratio': self.hits / total if total else None,
+                'schemas': len(self.schemas[0]) if self.schemas else 0, 'tables': sum(len(names) for names, _ in self.tables.values()),
+                'columns': len(self.columns)}
+
+
+class Dtype_registry():
+    def __init__(self, engine):
+        """
+        in process registry of stored table dtypes ('config'.'dtypes' table)
+        all definitions are loaded by one query, compiled sqlalchemy types are kept per (schema, table)
+        tables without schema belong to the default schema of the connection (dbo on sql server)
+
+        Args:
+            engine (sqlalchemy engine): target database engine
+        """
+        self.engine = engine
+        self.entries = {}        # {(schema, table): (process_id, {column_name: sqlalchemy type}) or None (not stored)}
+        self.loaded = False      # after load() a table which isn't in entries has no stored dtypes
+        self.stale = set()       # (schema, table) keys invalidated after load(), they're queried again
+        self.default_schema_name = None
+        self.lock = threading.RLock()
+        self.dtypes_table = sqlalchemy_sql.table('dtypes', sqlalchemy_sql.column('table'), sqlalchemy_sql.column('schema'),
+                                                 sqlalchemy_sql.column('dtypes_str'), sqlalchemy_sql.column('proccess_id'), schema='config')
+
+    @staticmethod
+    def dtypes_to_json(dtype_dict):
+        """
+        serializes a dtype dict to json --> {"column": ["NVARCHAR", {"length": 53}], "id": ["INTEGER", {}]}
+
+        Args:
+            dtype_dict (dict): {column_name: sqlalchemy type (class or instance)}
+
+        Returns:
+            str: json string
+        """
+        serialized = {}
+        for column, dtype in dtype_dict.items():
+            dtype = dtype() if isinstance(dtype, type) else dtype
+            arguments = {name: getattr(dtype, name) for name in ('length', 'precision', 'scale', 'timezone', 'collation')
+                         if getattr(dtype, name, None) not in (None, False)}
+            serialized[column] = [type(dtype).__name__, arguments]
+        return json.dumps(serialized, separators=(',', ':'))
+
+    @staticmethod
+    def compile_type(name, arguments):
+        # sqlalchemy type object from its class name and constructor arguments (sqlalchemy.types or sql server dialect classes, e.g. DATETIME2)
+        for module in (types, mssql):
+            dtype = getattr(module, name, None)
+            if isinstance(dtype, type) and issubclass(dtype, types.TypeEngine):
+                return dtype(**arguments)
+        raise Exception(f'unknown sqlalchemy type {name}')
+
+    def json_to_dtypes(self, dtypes_str):
+        """
+        parses a stored dtypes string, json (PySQL.create_dtypes) or old format "{'column': 'types.NVARCHAR(53)'}" (without eval)
+        old strings may have a collation --> 'types.NVARCHAR(53) COLLATE "Arabic_CI_AS"'
+
+        Args:
+            dtypes_str (str): stored dtypes string
+
+        Returns:
+            dict: {column_name: sqlalchemy type}
+        """
+        try:
+            serialized = json.loads(dtypes_str)
+        except ValueError:
+            serialized = {}
+            for column, type_string in ast.literal_eval(dtypes_str).items():
+                # str() of unsized types has no '(', so their old strings are like 'types.NVARCHAR COLLATE "Arabic_CI_AS"()'
+                match = re.fullmatch(r'types\.(\w+)(?:\(([^)]*)\))?(?: COLLATE "([^"]+)")?(?:\(\))?', type_string.replace('BOOLEAN', 'Boolean'))
+                if match is None:
+                    raise Exception(f'unreadable stored type {type_string}')
+                name, arguments, collation = match.group(1), match.group(2) or '', match.group(3)
+                positional_names = ['precision', 'scale'] if name.upper() in ('FLOAT', 'REAL', 'NUMERIC', 'DECIMAL') else ['length']
+                keyword_arguments = {}
+                for position, argument in enumerate(argument.strip() for argument in arguments.split(',') if argument.strip()):
+                    key, value = argument.split('=', 1) if '=' in argument else (positional_names[position], argument)
+                    keyword_arguments[key.strip()] = ast.literal_eval(value.strip())
+                if collation is not None:
+                    keyword_arguments['collation'] = collation
+                serialized[column] = [name, keyword_arguments]
+        return {column: self.compile_type(name, arguments) for column, (name, arguments) in serialized.items()}
+
+    def load(self):
+        """
+        loads all stored dtypes of the database by one query (last definition of every table)
+
+        Returns:
+            None
+        """
+        query = select(self.dtypes_table).order_by(self.dtypes_table.c.proccess_id)
+        try:
+            rows = self.engine.execute(query).fetchall()
+        except Exception:    # 'config'.'dtypes' is not created yet
+            rows = []
+        entries = {}
+        self._add_rows(entries, rows)
+        with self.lock:
+            self.entries = entries
+            self.loaded = True
+            self.stale = set()
+
+    def default_schema(self):
+        # schema of tables named without schema, rows stored without schema belong to it
+        if self.default_schema_name is None and self.engine is not None:
+            self.default_schema_name = inspect(self.engine).default_schema_name
+        return self.default_schema_name
+
+    def _key(self, table_name, schema=None):
+        return (self.default_schema() if schema is None else schema, table_name)
+
+    def _add_rows(self, entries, rows):
+        # compiles stored rows into entries (ordered by process id, so the last definition of a table wins)
+        # an unreadable row is skipped with a warning and the table keeps its previous definition
+        for row in rows:
+            try:
+                entries[self._key(row.table, row.schema)] = (row.proccess_id, self.json_to_dtypes(row.dtypes_str))
+            except Exception as Error:
+                warnings.warn(f"stored dtypes of {row.schema}.{row.table} (process_id {row.proccess_id}) are skipped: {Error}", RuntimeWarning)
+
+    def _load_table(self, key):
+        # loads one table dtypes (without load() or after invalidate)
+        schema, table_name = key
+        schema_column = self.dtypes_table.c.schema
+        in_schema = schema_column == schema if schema != self.default_schema() else sqlalchemy_sql.or_(schema_column == schema, schema_column.is_(None))
+        query = select(self.dtypes_table).where(and_(self.dtypes_table.c.table == table_name, in_schema))
+        try:
+            rows = self.engine.execute(query.order_by(self.dtypes_table.c.proccess_id)).fetchall()
+        except Exception:    # 'config'.'dtypes' is not created yet
+            rows = []
+        with self.lock:
+            self.entries.pop(key, None)
+            self._add_rows(self.entries, rows)
+            self.entries.setdefault(key, None)
+            self.stale.discard(key)
+
+    def get(self, table_name, schema=None):
+        """
+        Returns stored dtypes of a table (schema=None --> default schema of the connection)
+        after load() tables without stored dtypes are answered without a query (definitions stored by other processes
+        after load() are seen after invalidate)
+
+        Args:
+            table_name (str): target table name
+            schema (str): target schema name default=None
+
+        Returns:
+            dict or None: {column_name: sqlalchemy type} (a new dict in every call)
+        """
+        key = self._key(table_name, schema)
+        with self.lock:
+            if key in self.stale or (key not in self.entries and not self.loaded):
+                self._load_table(key)
+            entry = self.entries.get(key)
+            return dict(entry[1]) if entry is not None else None
+
+    def set(self, table_name, schema, dtype_dict, process_id):
+        with self.lock:
+            self.entries[self._key(table_name, schema)] = (process_id, {column: dtype() if isinstance(dtype, type) else dtype for column, dtype in dtype_dict.items()})
+
+    def invalidate(self, table_name=None, schema=None):
+        """
+        drops cached definitions (all of them without args), they're reloaded on next get
+
+        Returns:
+            None
+        """
+        with self.lock:
+            if table_name is None:
+                self.entries = {}
+                self.loaded = False
+                self.stale = set()
+            else:
+                key = self._key(table_name, schema)
+                self.entries.pop(key, None)
+                self.stale.add(key)
+
+
+class Query_cache():
+    def __init__(self, max_bytes=256 * 1024 ** 2, ttl=300, spill_dir=None, max_disk_bytes=1024 ** 3):
+        """
+        LRU cache of query results (dataframes) keyed by normalized sql text, params and read options
+        entries expire after ttl seconds, least recently used entries are evicted (or spilled to parquet files) over max_bytes
+        entries of a table are dropped by PySQL writes to it (PySQL.to_sql/set_primary_key/sync_table)
+
+        Args:
+            max_bytes (int, optional): memory budget (default is 256MB)
+            ttl (int/float, optional): seconds to keep entries (default is 300, None --> never expire)
+            spill_dir (str, optional): directory of spilled parquet files, needs pyarrow (default is None --> evicted entries are dropped)
+            max_disk_bytes (int, optional): disk budget of spilled files (default is 1GB)
+        """
+        if spill_dir is not None:
+            try:
+                import pyarrow
+            except ImportError:
+                raise Exception("pyarrow is needed for spill_dir --> pip install pyarrow")
+            os.makedirs(spill_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.spill_dir = spill_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = OrderedDict()     # {key: {'df', 'path', 'bytes', 'time', 'tables'}} in LRU order (df is None for spilled entries)
+        self.memory_bytes = 0
+        self.disk_bytes = 0
+        self.generation = 0              # invalidations count, results read before an invalidation are not stored
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def normalize_sql(sql):
+        # whitespace/trailing ; insensitive sql text
+        return re.sub(r'\s+', ' ', sql).strip().rstrip(';').strip()
+
+    table_alias = r"""(?:\s+(?:as\s+)?(?!(?:where|join|inner|left|right|full|cross|outer|on|group|order|having|union|except|intersect|with|option|for|apply|pivot|unpivot)\b)[\[\]"`\w]+)?
+                      (?:\s+with\s*\([^()]*\))?\s*"""       # alias and table hints
+    table_item = re.compile(r'\s*((?:[\[\]"`\w#]+\.)*[\[\]"`\w#]+)' + table_alias, flags=re.IGNORECASE | re.VERBOSE)
+    subquery_alias = re.compile(table_alias, flags=re.IGNORECASE | re.VERBOSE)
+
+    @classmethod
+    def referenced_tables(cls, sql):
+        """
+        Returns tables of FROM (comma separated lists too), JOIN and APPLY clauses of a sql text (subqueries are parsed by their own clauses)
+        None is returned when tables can't be parsed with confidence (not a SELECT/WITH query, table valued functions, ...),
+        results of such queries are not cached
+
+        Returns:
+            set or None: {(schema or None, table)} in lower case
+        """
+        if not re.match(r'\s*(?:select|with)\b', sql, flags=re.IGNORECASE):
+            return None
+        tables = set()
+        for clause in re.finditer(r'\b(from|join|apply)\s+', sql, flags=re.IGNORECASE):
+            position = clause.end()
+            while True:
+                if sql.startswith('(', position):
+                    if not re.match(r'\(\s*(?:select|with)\b', sql[position:], flags=re.IGNORECASE):
+                        return None
+                    depth = 0
+                    for end in range(position, len(sql)):      # subquery is skipped up to its closing parenthesis
+                        depth += {'(': 1, ')': -1}.get(sql[end], 0)
+                        if depth == 0:
+                            break
+                    else:
+                        return None
+                    item = cls.subquery_alias.match(sql, end + 1)
+                else:
+                    item = cls.table_item.match(sql, position)
+                    if item is None:
+                        return None
+                    parts = [part.strip('[]"`').lower() for part in item.group(1).split('.')]
+                    tables.add((parts[-2] if len(parts) > 1 else None, parts[-1]))
+                position = item.end()
+                if sql.startswith('(', position):      # function call
+                    return None
+                if clause.group(1).lower() != 'from' or not sql.startswith(',', position):
+                    break
+                position += 1
+                position = re.match(r'\s*', sql[position:]).end() + position
+        return tables
+
+    @classmethod
+    def make_key(cls, query, params=None, **options):
+        # (sql, params, read options) of a str, text or select query (bound values of text/select are part of params)
+        if not isinstance(query, str):
+            compiled = query.compile()
+            query, params = str(compiled), [compiled.params, params]
+        return (cls.normalize_sql(query), json.dumps(params, sort_keys=True, default=str), json.dumps(options, sort_keys=True, default=str))
+
+    def _drop(self, key):
+        entry = self.entries.pop(key)
+        if entry['df'] is not None:
+            self.memory_bytes -= entry['bytes']
+        if entry['path'] is not None:
+            self.disk_bytes -= entry['disk_bytes']
+            if os.path.exists(entry['path']):
+                os.remove(entry['path'])
+
+    def get(self, key):
+        """
+        Returns a copy of a cached result and the cache generation (pass it to put after a miss)
+
+        Args:
+            key (tuple): Query_cache.make_key result
+
+        Returns:
+            tuple: (dataframe or None, generation)
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry['time'] >= self.ttl:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None, self.generation
+            self.hits += 1
+            self.entries.move_to_end(key)
+            if entry['df'] is not None:
+                return entry['df'].copy(), self.generation
+            path = entry['path']
+        try:
+            return pd.read_parquet(path), self.generation
+        except Exception:      # spilled file is lost
+            with self.lock:
+                if key in self.entries:
+                    self._drop(key)
+            return None, self.generation
+
+    def put(self, key, df, generation):
+        """
+        stores a result (skipped when a table was invalidated after generation, it's bigger than the memory budget or its tables are unknown)
+
+        Returns:
+            None
+        """
+        size = int(df.memory_usage(deep=True).sum())
+        with self.lock:
+            tables = self.referenced_tables(key[0])
+            if generation != self.generation or size > self.max_bytes or tables is None:
+                return
+            if key in self.entries:
+                self._drop(key)
+            self.entries[key] = {'df': df.copy(), 'path': None, 'bytes': size, 'disk_bytes': 0, 'time': time.monotonic(), 'tables': tables}
+            self.memory_bytes += size
+            self._evict()
+
+    def _evict(self):
+        # least recently used in memory entries go to disk (or are dropped) until memory is under budget
+        for key in list(self.entries):
+            if self.memory_bytes <= self.max_bytes:
+                break
+            entry = self.entries[key]
+            if entry['df'] is None:
+                continue
+            self.evictions += 1
+            if self.spill_dir is None:
+                self._drop(key)
+                continue
+            path = os.path.join(self.spill_dir, f'pysql_cache_{uuid.uuid4().hex}.parquet')
+            try:
+                entry['df'].to_parquet(path)
+            except Exception:      # not parquet compatible (e.g. mixed object column)
+                self._drop(key)
+                continue
+            self.memory_bytes -= entry['bytes']
+            entry['df'], entry['path'], entry['disk_bytes'] = None, path, os.path.getsize(path)
+            self.disk_bytes += entry['disk_bytes']
+        for key in list(self.entries):
+            if self.disk_bytes <= self.max_disk_bytes:
+                break
+            if self.entries[key]['path'] is not None:
+                self._drop(key)
+
+    def invalidate(self, table_name=None, schema=None):
+        """
+        drops cached results which reference a table (all of them without args)
+
+        Args:
+            table_name (str, optional): written table
+            schema (str, optional): its schema (results which reference the table without schema are dropped too)
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.generation += 1
+            self.invalidations += 1
+            for key in list(self.entries):
+                if table_name is None or any(table == table_name.lower() and (table_schema is None or schema is None or table_schema == schema.lower())
+                                             for table_schema, table in self.entries[key]['tables']):
+                    self._drop(key)
+
+    def stats(self):
+        """
+        Returns cache counters
+
+        Returns:
+            dict: hits, misses, hit_ratio, entries, memory_bytes, disk_entries, disk_bytes, evictions, invalidations
+        """
+        with self.lock:
+            requests = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'hit_ratio': self.hits / requests if requests else None,
+                    'entries': len(self.entries), 'memory_bytes': self.memory_bytes,
+                    'disk_entries': sum(entry['df'] is None for entry in self.entries.values()), 'disk_bytes': self.disk_bytes,
+                    'evictions': self.evictions, 'invalidations': self.invalidations}
+
+
+class Metrics():
+    def __init__(self, buckets=None):
+        """
+        in-memory counters and histograms of PySQL calls (filled by PySQL._log_decorator and streams)
+        sampled call records are sent to an exporter (see PySQL.set_metrics_exporter)
+
+        Args:
+            buckets (list, optional): upper bounds of histogram buckets in seconds (default is 0.0001s to ~1.8h, doubling)
+        """
+        self.buckets = buckets or [0.0001 * 2 ** i for i in range(27)]
+        self.counters = {}           # {name: value}
+        self.histograms = {}         # {name: {'count', 'sum', 'min', 'max', 'buckets': counts per bucket (+ overflow)}}
+        self.exporter = None
+        self.sample_rate = 1.0
+        self.slow_seconds = None
+        self.lock = threading.Lock()
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = {'count': 0, 'sum': 0.0, 'min': value, 'max': value, 'buckets': [0] * (len(self.buckets) + 1)}
+            histogram['count'] += 1
+            histogram['sum'] += value
+            histogram['min'] = min(histogram['min'], value)
+            histogram['max'] = max(histogram['max'], value)
+            histogram['buckets'][int(np.searchsorted(self.buckets, value))] += 1
+
+    def percentile(self, name, q):
+        """
+        estimates a percentile of a histogram (upper bound of the bucket which contains it)
+
+        Args:
+            name (str): histogram name, e.g. 'to_sql.seconds'
+            q (int/float): percentile (0-100)
+
+        Returns:
+            float or None: None for unknown histograms
+        """
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                return None
+            rank = q / 100 * histogram['count']
+            seen = 0
+            for bound, count in zip(self.buckets + [histogram['max']], histogram['buckets']):
+                seen += count
+                if count and seen >= rank:
+                    return min(bound, histogram['max'])
+            return histogram['max']
+
+    def record(self, record):
+        """
+        adds a call record to counters/histograms and exports it when it's sampled (failed and slow calls are always exported)
+
+        Args:
+            record (dict): function, process_id, state, seconds, rows_in, rows_out, bytes_in, bytes_out, stages and error of a call
+
+        Returns:
+            None
+        """
+        function = record['function']
+        self.count(f'{function}.calls')
+        if record['state'] != 'success':
+            self.count(f'{function}.errors')
+        for key in ('rows_in', 'rows_out', 'bytes_in', 'bytes_out'):
+            if record.get(key) is not None:
+                self.count(f'{function}.{key}', record[key])
+        self.observe(f'{function}.seconds', record['seconds'])
+        for stage, seconds in record['stages'].items():
+            self.observe(f'{function}.{stage}.seconds', seconds)
+        if self.exporter is None:
+            return
+        if (record['state'] != 'success' or (self.slow_seconds is not None and record['seconds'] >= self.slow_seconds)
+                or np.random.random() < self.sample_rate):
+            try:
+                self.exporter(record)
+            except Exception as Error:
+                print(f'metrics exporter failed: {Error}')
+
+    def snapshot(self):
+        """
+        Returns a copy of counters and histograms (with p50/p95/p99 estimates)
+
+        Returns:
+            dict: {'counters': {...}, 'histograms': {name: {'count', 'sum', 'min', 'max', 'mean', 'p50', 'p95', 'p99'}}}
+        """
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {name: {key: value for key, value in histogram.items() if key != 'buckets'} for name, histogram in self.histograms.items()}
+        for name, histogram in histograms.items():
+            histogram['mean'] = histogram['sum'] / histogram['count']
+            for q in (50, 95, 99):
+                histogram[f'p{q}'] = self.percentile(name, q)
+        return {'counters': counters, 'histograms': histograms}
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.histograms = {}
+
+
+class Local_attribute():
+    def __init__(self, default_factory=None):
+        """
+        PySQL attribute which has a separate value in every thread (per call state, e.g. PySQL.df of the last to_sql of the thread)
+
+        Args:
+            default_factory (callable, optional): creates the value of threads which didn't set it (default is None --> None)
+        """
+        self.default_factory = default_factory
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        if not hasattr(instance.local, self.name):
+            setattr(instance.local, self.name, self.default_factory() if self.default_factory else None)
+        return getattr(instance.local, self.name)
+
+    def __set__(self, instance, value):
+        setattr(instance.local, self.name, value)
+
+
+class PySQL():
+    df = Local_attribute()
+    log_data = Local_attribute()
+    insert_report = Local_attribute(dict)
+    load_report = Local_attribute(dict)
+    preprocess_report = Local_attribute(list)
+
+    def __init__(self):
+        self.log_dtypes =  {'function':types.VARCHAR(50), 'state':types.VARCHAR(50), 'log':types.VARCHAR(2000), 'connection_user':types.VARCHAR(50), 'process_id':types.INT(), 'datetime':types.DATETIME()}
+        self.dtypes_types = {'table':types.VARCHAR(50), 'schema':types.VARCHAR(50), 'dtypes_str':types.NVARCHAR(None), 'process_id':types.INT()}
+        self.watermarks_types = {'sync_name':types.VARCHAR(300), 'watermark_column':types.VARCHAR(128), 'watermark':types.NVARCHAR(100),
+                                 'rows':types.BIGINT(), 'process_id':types.INT(), 'datetime':types.DATETIME()}
+        self.watermarks_table = sqlalchemy_sql.table('watermarks', *[sqlalchemy_sql.column(column) for column in self.watermarks_types], schema='config')
+        self.local = threading.local()
+        self.process_id = -1                 # last allocated process id (PySQL.next_process_id)
+        self.process_id_lock = threading.Lock()
+        self.dtypes = {}
+        self.max_parameters = 2100           # sql server parameters limit per statement
+        self.max_values_rows = 1000          # sql server rows limit per INSERT ... VALUES
+        self.insert_buffer_bytes = 32 * 1024 ** 2   # parameter array size of each fast_executemany batch
+        self.log_mode = 'sync'
+        self.log_file = 'pysql_log.csv'
+        self.log_file_lock = threading.Lock()
+        self.log_table_lock = threading.Lock()
+        self.dtypes_table_lock = threading.Lock()
+        self.watermarks_table_lock = threading.Lock()
+        self.log_atexit = False
+        self.metrics = Metrics()
+        self.query_cache = None              # PySQL.enable_query_cache
+        self.metrics_file = 'pysql_metrics.jsonl'
+        self.metrics_file_lock = threading.Lock()
+        self.raise_errors = False            # re-raise errors of logged methods (they're printed, logged and counted anyway)
+        
+    def _log_decorator(func):  
+        def wrapper(self, *args, **kwargs):
+            parent_process_id = getattr(self.local, 'process_id', None)
+            parent_call = getattr(self.local, 'call', None)
+            self.local.process_id = self.next_process_id()
+            self.local.call = {'function': func.__name__, 'stages': {}}
+            start = time.perf_counter()
+            state, error, func_result = 'success', None, None
+            try:
+                with self.measure_stage('log'):
+                    self.logger(func.__name__ , 'start', 'success')
+                func_result = func(self, *args, **kwargs)
+                with self.measure_stage('log'):
+                    self.logger(func.__name__ , 'end', 'success')
+                return func_result
+            except Exception as Error:
+                state, error = 'error', f'{type(Error).__name__}: {Error}'
+                print(Error)
+                with self.measure_stage('log'):
+                    self.logger(func.__name__ , 'progress', str(Error))
+                if self.raise_errors:
+                    raise
+            finally:
+                rows_in, bytes_in = self.data_size(args[0] if args else kwargs.get('df'))
+                rows_out, bytes_out = self.data_size(func_result)
+                self.metrics.record({'function': func.__name__, 'process_id': self.local.process_id, 'state': state, 'error': error,
+                                     'seconds': time.perf_counter() - start, 'rows_in': rows_in, 'rows_out': rows_out,
+                                     'bytes_in': bytes_in, 'bytes_out': bytes_out, 'stages': self.local.call['stages']})
+                self.local.process_id = parent_process_id
+                self.local.call = parent_call
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        return wrapper    
+
+    @contextlib.contextmanager
+    def measure_stage(self, name):
+        """
+        adds the time of a with block to the stages of the running logged call (PySQL.metrics histogram '<function>.<name>.seconds')
+
+        Args:
+            name (str): stage name, e.g. preprocess/insert/merge/ddl/log
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            call = getattr(self.local, 'call', None)
+            if call is not None:
+                call['stages'][name] = call['stages'].get(name, 0.0) + time.perf_counter() - start
+
+    def data_size(self, data):
+        """
+        Returns rows and bytes (shallow memory usage) of a call input/output for metrics
+
+        Args:
+            data: dataframe, series, row count or upsert result ({'inserted', 'updated'})
+
+        Returns:
+            tuple: (rows or None, bytes or None)
+        """
+        if isinstance(data, pd.DataFrame):
+            return len(data), int(data.memory_usage(deep=False).sum())
+        if isinstance(data, pd.Series):
+            return len(data), int(data.memory_usage(deep=False))
+        if isinstance(data, (int, np.integer)) and not isinstance(data, bool):
+            return int(data), None
+        if isinstance(data, dict) and set(data) == {'inserted', 'updated'}:
+            return data['inserted'] + data['updated'], None
+        return None, None
+
+    def set_metrics_exporter(self, exporter='log', sample_rate=0.01, slow_seconds=None, metrics_file='pysql_metrics.jsonl'):
+        """
+        sets where sampled call records of PySQL.metrics are sent
+            -callable: exporter(record) is called with the record dict
+            -file: records are appended to a local json lines file (metrics_file)
+            -log: records are logged by PySQL.logger with 'metrics' state (use log_mode='async' to keep them out of the call)
+            -None: no export (counters/histograms are kept anyway)
+
+        Args:
+            exporter (callable or str): see above default : log
+            sample_rate (float): ratio of exported calls default : 0.01
+            slow_seconds (int/float): calls slower than this (and failed calls) are always exported default : None
+            metrics_file (str): file of file exporter default : pysql_metrics.jsonl
+
+        Returns:
+            None
+        """
+        if exporter == 'file':
+            self.metrics_file = metrics_file
+            exporter = self.write_metrics_file
+        elif exporter == 'log':
+            exporter = lambda record: self.logger(record['function'], 'metrics', json.dumps(record, default=str), process_id=record['process_id'])
+        elif exporter is not None and not callable(exporter):
+            raise Exception(f'unknown metrics exporter {exporter}, use a callable, file, log or None')
+        self.metrics.exporter = exporter
+        self.metrics.sample_rate = sample_rate
+        self.metrics.slow_seconds = slow_seconds
+
+    def write_metrics_file(self, record):
+        # file exporter of PySQL.metrics (one json record per line)
+        with self.metrics_file_lock:
+            with open(self.metrics_file, 'a', encoding='utf-8') as metrics_file:
+                metrics_file.write(json.dumps(record, default=str) + '\n')
+
+    def next_process_id(self):
+        """
+        allocates a new process id (thread safe)
+
+        Returns:
+            int: process id
+        """
+        with self.process_id_lock:
+            self.process_id += 1
+            return self.process_id
+
+    def current_process_id(self):
+        """
+        Returns process id of the running PySQL method call in this thread (last allocated one out of method calls)
+
+        Returns:
+            int: process id
+        """
+        process_id = getattr(self.local, 'process_id', None)
+        return self.process_id if process_id is None else process_id
+    
+    def logger(self, func, state, log, process_id=None):
+        """
+        basic logging system by PySQL 
+        stores in 'config' schema and 'log' table
+        connection_user, process_id and datetime joins via your input params automaticly
+
+        Args:
+            func (function object): an function (it's need to have __name__ variable')
+            state (str): any thing but start/stop/progress is suggested
+            log (str): log string
+            process_id (int, optional): process id of the record (default is None --> PySQL.current_process_id())
+            
+        Returns:
+            None
+        """
+        if len(log)> 2000:
+            log = log[:1999]
+        now = datetime.now().isoformat().replace('T', ' ').split('.')[0]
+        log_data = {'function':func, 'state':state, 'log':log,'connection_user':self.username ,'process_id':self.current_process_id() if process_id is None else process_id, 'datetime':now}
+        if self.log_mode == 'async' and self.log_thread.is_alive():
+            self.log_queue.put(log_data)
+        elif self.log_mode == 'file':
+            self.write_logs_file([log_data])
+        else:
+            self.write_logs_table([log_data])
+
+    def write_logs_table(self, records):
+        """
+        writes log records to 'config'.'log' table in one insert
+
+        Args:
+            records (list): log records (dicts with log table columns)
+
+        Returns:
+            None
+        """
+        if not self.metadata_cache.has_schema('config'):  # check for config schema
+            self.create_schema('config')
+            print('config schema not exist! \n new created!')
+        self.log_data = pd.DataFrame(records, columns=list(self.log_dtypes.keys()))
+        if not self.metadata_cache.has_table('log', 'config'):
+            with self.log_table_lock:    # first records of concurrent calls would all create the table
+                if not self.metadata_cache.has_table('log', 'config'):
+                    self.log_data.head(0).to_sql('log', con=self.engine, schema='config', if_exists='append', dtype=self.log_dtypes, index=False)
+                    self.metadata_cache.add_table('log', 'config')
+        self.log_data.to_sql('log', con=self.engine, schema='config', if_exists='append', dtype=self.log_dtypes, index=False)
+
+    def write_logs_file(self, records):
+        """
+        appends log records to the local csv log file (PySQL.log_file)
+
+        Args:
+            records (list): log records (dicts with log table columns)
+
+        Returns:
+            None
+        """
+        with self.log_file_lock:
+            file_exists = os.path.exists(self.log_file)
+            with open(self.log_file, 'a', newline='', encoding='utf-8') as log_file:
+                writer = csv.DictWriter(log_file, fieldnames=list(self.log_dtypes.keys()))
+                if not file_exists:
+                    writer.writeheader()
+                writer.writerows(records)
+
+    def set_log_mode(self, log_mode='async', batch_size=500, flush_interval=5, log_file='pysql_log.csv'):
+        """
+        sets how PySQL.logger delivers log records
+            -sync: every record is inserted to 'config'.'log' immediately (default)
+            -async: records are queued and a background thread inserts them in batches
+                    (when batch_size records are queued or every flush_interval seconds, and on exit)
+            -file: records are appended to a local csv file (log_file)
+
+        Args:
+            log_mode (str): sync/async/file
+            batch_size (int): async mode max records in each insert
+            flush_interval (int/float): async mode max seconds a record waits in the queue
+            log_file (str): local csv file for file mode (and for async records which can't be inserted)
+
+        Returns:
+            None
+        """
+        if log_mode not in ('sync', 'async', 'file'):
+            raise Exception(f"unknown log_mode '{log_mode}' use sync/async/file")
+        self.close_logs()
+        self.log_mode = log_mode
+        self.log_batch_size = batch_size
+        self.log_flush_interval = flush_interval
+        self.log_file = log_file
+        if log_mode == 'async':
+            self.log_queue = queue.Queue()
+            self.log_thread = threading.Thread(target=self._log_writer, name='pysql-log-writer', daemon=True)
+            self.log_thread.start()
+            if not self.log_atexit:
+                atexit.register(self.close_logs)
+                self.log_atexit = True
+
+    def _log_writer(self):
+        # background thread of async log mode, queue items are records, flush events or None (stop)
+        records = []
+        last_flush = time.monotonic()
+        running = True
+        while running:
+            timeout = max(0.01, self.log_flush_interval - (time.monotonic() - last_flush))
+            try:
+                item = self.log_queue.get(timeout=timeout)
+            except queue.Empty:
+                item = {}
+            flush_event = None
+            if item is None:
+                running = False
+            elif isinstance(item, threading.Event):
+                flush_event = item
+            elif item:
+                records.append(item)
+            if records and (not running or flush_event or len(records) >= self.log_batch_size or time.monotonic() - last_flush >= self.log_flush_interval):
+                try:
+                    self.write_logs_table(records)
+                except Exception as Error:
+                    print(f'log insert failed, {len(records)} records are stored in {self.log_file} \n {Error}')
+                    self.write_logs_file(records)
+                records = []
+            if not records:
+                last_flush = time.monotonic()
+            if flush_event:
+                flush_event.set()
+
+    def flush_logs(self, timeout=30):
+        """
+        waits until queued log records (async mode) are inserted
+
+        Args:
+            timeout (int/float): max seconds to wait
+
+        Returns:
+            None
+        """
+        if self.log_mode == 'async' and self.log_thread.is_alive():
+            flush_event = threading.Event()
+            self.log_queue.put(flush_event)
+            flush_event.wait(timeout)
+
+    def close_logs(self, timeout=30):
+        """
+        flushes queued log records and stops the async log writer thread (called automaticly on exit)
+        log mode is sync after it, records of later PySQL.logger calls are inserted immediately
+
+        Returns:
+            None
+        """
+        if self.log_mode == 'async' and self.log_thread.is_alive():
+            self.log_queue.put(None)
+            self.log_thread.join(timeout)
+        if self.log_mode == 'async' and not self.log_thread.is_alive():
+            self.log_mode = 'sync'
+            records = []
+            while not self.log_queue.empty():      # queued while the writer was stopping
+                item = self.log_queue.get_nowait()
+                if isinstance(item, threading.Event):
+                    item.set()
+                elif item:
+                    records.append(item)
+            if records:
+                try:
+                    self.write_logs_table(records)
+                except Exception as Error:
+                    print(f'log insert failed, {len(records)} records are stored in {self.log_file} \n {Error}')
+                    self.write_logs_file(records)
+        
+    def create_connection(self, server, database, username, password, port=1433, log_mode='sync', log_batch_size=500, log_flush_interval=5, log_file='pysql_log.csv', metadata_ttl=300,
+                          pool_size=5, max_overflow=10, pool_timeout=30, pool_recycle=-1, pool_pre_ping=False):
+        """
+        creates a pysql.engine connection to your target database
+        in order to have best experience to use, your sql_user(username) must to have datawriter, datareader and ddladmin 
+        Args:
+            server (str): your host server (ip)
+            database (str): target database
+            username (str): username 
+            password (str): password 
+            port (str): connection port default : 1433
+            log_mode (str): sync/async/file, see PySQL.set_log_mode default : sync
+            log_batch_size (int): async log mode max records in each insert default : 500
+            log_flush_interval (int/float): async log mode max seconds a record waits in the queue default : 5
+            log_file (str): local csv file of file log mode default : pysql_log.csv
+            metadata_ttl (int/float): seconds to cache schema/table/column metadata (PySQL.metadata_cache) default : 300
+            pool_size (int): connections kept open in the pool default : 5
+            max_overflow (int): connections opened over pool_size when all of them are in use default : 10
+            pool_timeout (int/float): seconds to wait for a free connection default : 30
+            pool_recycle (int): reconnects connections older than this seconds (-1 --> never) default : -1
+            pool_pre_ping (bool): checks connections before using them default : False
+            (one PySQL object can be used by many threads, pool_size + max_overflow is the max concurrent database calls)
+            
+        Returns:
+            None
+        """
+        self.server = server
+        self.database = database
+        self.username = username
+        self.password = password
+        self.port = port
+        self.connection_str = f"mssql+pyodbc://{self.username}:{self.password}@{self.server}:{self.port}/{self.database}?driver=ODBC+Driver+17+for+SQL+Server"
+        self.engine = create_engine(self.connection_str, pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout,
+                                    pool_recycle=pool_recycle, pool_pre_ping=pool_pre_ping)
+        self.metadata_cache = Metadata_cache(self.engine, ttl=metadata_ttl)
+        self.dtype_registry = Dtype_registry(self.engine)
+        self.dtype_registry.load()
+        self.set_log_mode(log_mode, batch_size=log_batch_size, flush_interval=log_flush_interval, log_file=log_file)
+        self.logger('create_connection', 'success', 'connected')
+        if self.log_mode == 'file':
+            self.lastlog = pd.read_csv(self.log_file, usecols=['process_id'])
+        else:
+            self.flush_logs()
+            self.lastlog = self.read_sql_table('log', schema='config', columns=['process_id'])
+        self.process_id = self.lastlog.process_id.values.tolist()
+        self.process_id = max([int(i) for i in self.process_id])
+
+    @_log_decorator 
+    def to_sql(self, df, table_name, schema=None, if_exists='append', index=True, index_label=None, primary_key=None, chunksize=None, date_normalizer=True, text_cutter=True, insert_method='auto', staging_dir=None, dtype=None):
+        """
+        Write records stored in a DataFrame to a SQL database.
+    
+        Parameters
+        ----------
+        df : DataFrame, Series
+        table_name : str
+            Name of SQL table.
+        schema : str, optional
+            Name of SQL schema in database to write to (if database flavor
+            supports this). If None, use default schema (default).
+        if_exists : {'fail', 'replace', 'append', 'upsert'}, default 'append'
+            - fail: If table exists, do nothing.
+            - replace: If table exists, drop it, recreate it, and insert data.
+            - append: If table exists, insert data. Create if does not exist.
+            - upsert: If table exists, update rows with existing keys and insert new ones
+              (staging table + one MERGE, keys are primary_key or table's primary key).
+              Create if does not exist. returns {'inserted': n, 'updated': n}
+        index : bool, default True
+            Write DataFrame index as a column.
+        index_label : str or sequence, optional
+            Column label for index column(s). If None is given (default) and
+            `index` is True, then the index names are used.
+            A sequence should be given if the DataFrame uses MultiIndex.
+        primary_key : str or list, optional
+            it uses pysql.set_primary_key so :
+            just one time allowed (if PK exists error!)
+            PK must be unique in every rows   
+            (with if_exists='upsert' on an existing table it's used as merge keys)
+        chunksize : int, optional
+            Specify the number of rows in each batch to be written at a time.
+            By default, it's calculated by PySQL.insert_plan from column count and row width.
+        date_normalizer : bool, default True
+            its run PySQL.date_normalizer and make date formats storable foe sql server
+        text_cutter : bool, default True
+            its run PySQL.text_cutter and cuts texts longer than column capacity
+            (df is not changed, per column stats are stored in PySQL.preprocess_report)
+        dtype : dict, optional
+            {column_name: sqlalchemy type} of this call, by default dtypes of the table are taken from
+            PySQL.dtype_registry (stored by PySQL.create_dtypes) and PySQL.dtypes is used for tables without stored dtypes
+        insert_method : {'auto', 'fast_executemany', 'multi_values', 'bulk', 'default'} or callable, default 'auto'
+            - auto: fast_executemany for pyodbc connections, multi_values for others.
+            - fast_executemany: pyodbc parameter arrays (one round trip per batch).
+            - multi_values: multi-row INSERT ... VALUES statements under the 2100 parameters limit.
+            - bulk: stages the rows in a csv file and runs BULK INSERT (file must be readable by sql server).
+            - default: pandas row by row insert.
+            - callable: pandas ``method`` callable with signature (pd_table, conn, keys, data_iter).
+            rows/sec of the insert is stored in PySQL.insert_report
+        staging_dir : str, optional
+            directory for bulk insert staging files, it must be reachable by sql server with the same path
+            (default is the temp directory, usable when sql server is on the same machine)
+    
+    
+            .. versionadded:: 1.3.0
+    
+        **engine_kwargs
+            Any additional kwargs are passed to the engine.
+    
+        Returns
+        -------
+        None or int
+            Number of rows affected by to_sql. None is returned if the callable
+            passed into ``method`` does not return the number of rows.
+        """
+        if schema!= None:
+            if not self.metadata_cache.has_schema(schema):  # check for schema existance
+                self.create_schema(schema)
+        if dtype is None:
+            dtype = self.dtype_registry.get(table_name, schema=schema)
+        dtypes = (self.dtypes if dtype is None else dtype) | {'process_id':types.INT()}
+        with self.measure_stage('preprocess'):
+            df = self.preprocess(df, date_normalizer=date_normalizer, text_cutter=text_cutter, dtypes=dtypes)
+        
+        self.df = df
+        if if_exists == 'upsert' and self.metadata_cache.has_table(table_name, schema):
+            return self.upsert(df, table_name, schema=schema, index=index, index_label=index_label, primary_key=primary_key,
+                               chunksize=chunksize, insert_method=insert_method, staging_dir=staging_dir, dtypes=dtypes)
+        row_number = self.insert(df, table_name, schema=schema, if_exists='append' if if_exists == 'upsert' else if_exists, index=index, index_label=index_label,
+                                 chunksize=chunksize, insert_method=insert_method, staging_dir=staging_dir, dtypes=dtypes)
+
+        if primary_key != None:
+            self.set_primary_key(table_name=table_name, schema=schema, column_name=primary_key, dtypes=dtypes)
+        if if_exists == 'upsert':
+            return {'inserted': len(df), 'updated': 0}
+        return row_number
+
+    def insert(self, df, table_name, schema=None, if_exists='append', index=True, index_label=None, chunksize=None, insert_method='auto', staging_dir=None, dtypes=None, connection=None):
+        """
+        inserts a preprocessed dataframe by the insert_method of PySQL.to_sql and stores PySQL.insert_report
+        (dtypes default is None --> PySQL.dtypes, connection default is None --> PySQL.engine, pass a connection to insert in its transaction)
+
+        Returns:
+            None or int: number of rows affected
+        """
+        dtypes = self.dtypes if dtypes is None else dtypes
+        start = time.perf_counter()
+        with self.measure_stage('insert'):
+            if insert_method == 'bulk':
+                row_number = self.bulk_insert(df, table_name, schema=schema, if_exists=if_exists, index=index, index_label=index_label, staging_dir=staging_dir, dtypes=dtypes,
+                                              connection=connection)
+            else:
+                method, chunksize = self.insert_plan(df, insert_method=insert_method, chunksize=chunksize, index=index, dtypes=dtypes)
+                row_number = df.to_sql(name=table_name, con=self.engine if connection is None else connection, schema=schema, if_exists=if_exists, index=index, index_label=index_label, dtype=dtypes, chunksize=chunksize, method=method)
+        seconds = time.perf_counter() - start
+        if if_exists == 'replace':
+            self.metadata_cache.invalidate(schema, table_name)
+        self.metadata_cache.add_table(table_name, schema)
+        self.table_written(table_name, schema)
+        self.insert_report = {'table': table_name, 'schema': schema, 'insert_method': insert_method if isinstance(insert_method, str) else insert_method.__name__,
+                              'chunksize': chunksize, 'rows': len(df), 'seconds': seconds, 'rows_per_sec': len(df) / seconds if seconds else None}
+        return row_number
+
+    def upsert(self, df, table_name, schema=None, index=True, index_label=None, primary_key=None, chunksize=None, insert_method='auto', staging_dir=None, dtypes=None):
+        """
+        inserts new rows and updates existing rows (by key columns) of a table with one set based MERGE
+        the dataframe is loaded to a staging table by the insert_method of PySQL.to_sql, merged and the staging table is dropped
+
+        Args:
+            df (pandas dataframe): preprocessed dataframe (PySQL.preprocess)
+            table_name (str): target table name (it must exist)
+            schema (str): target schema name default=None
+            primary_key (str or list, optional): key columns (default is None --> primary key of the table)
+            dtypes (dict, optional): {column_name: sqlalchemy type} (default is None --> PySQL.dtypes)
+
+        Returns:
+            dict: {'inserted': rows count, 'updated': rows count}
+        """
+        keys = [primary_key] if isinstance(primary_key, str) else primary_key
+        if not keys:
+            keys = self.metadata_cache.get_primary_key(table_name, schema=schema)
+        if not keys:
+            raise Exception(f"{table_name} has no primary key, use primary_key='column_name' for upsert")
+
+        stage_name = f'{table_name}__pysql_stage_{self.current_process_id()}'
+        full_table_name = f'[{schema}].[{table_name}]' if schema != None else f'[{table_name}]'
+        full_stage_name = f'[{schema}].[{stage_name}]' if schema != None else f'[{stage_name}]'
+        try:
+            self.insert(df, stage_name, schema=schema, if_exists='replace', index=index, index_label=index_label,
+                        chunksize=chunksize, insert_method=insert_method, staging_dir=staging_dir, dtypes=dtypes)
+            insert_report = self.insert_report
+            columns = [column['name'] for column in self.metadata_cache.get_columns(stage_name, schema=schema)]
+            on_keys = ' AND '.join(f'target.[{key}] = source.[{key}]' for key in keys)
+            update_columns = ', '.join(f'target.[{column}] = source.[{column}]' for column in columns if column not in keys)
+            insert_columns = ', '.join(f'[{column}]' for column in columns)
+            insert_values = ', '.join(f'source.[{column}]' for column in columns)
+            MERGE_QUERY = f"""SET NOCOUNT ON;
+                              DECLARE @actions TABLE ([action] NVARCHAR(10));
+                              MERGE {full_table_name} WITH (HOLDLOCK) AS target
+                              USING {full_stage_name} AS source
+                              ON {on_keys}
+                              {f'WHEN MATCHED THEN UPDATE SET {update_columns}' if update_columns else ''}
+                              WHEN NOT MATCHED BY TARGET THEN INSERT ({insert_columns}) VALUES ({insert_values})
+                              OUTPUT $action INTO @actions;
+                              SELECT COUNT(CASE WHEN [action] = 'INSERT' THEN 1 END) AS inserted,
+                                     COUNT(CASE WHEN [action] = 'UPDATE' THEN 1 END) AS updated
+                              FROM @actions;"""
+            with self.measure_stage('merge'), self.engine.begin() as connection:
+                inserted, updated = connection.execute(text(MERGE_QUERY)).one()    # counted from the rows the MERGE changed
+        finally:
+            self.metadata_cache.invalidate(schema, stage_name)
+            if self.metadata_cache.has_table(stage_name, schema):     # a failed staging insert may not have created it
+                with self.measure_stage('ddl'):
+                    self.engine.execute(f'DROP TABLE {full_stage_name}')
+                self.metadata_cache.invalidate(schema, stage_name)
+            self.table_written(table_name, schema)
+        self.insert_report = insert_report | {'table': table_name, 'inserted': inserted, 'updated': updated}
+        return {'inserted': inserted, 'updated': updated}
+    
+    @_log_decorator
+    def tables_list(self, schema=None):
+        """
+        Returns table list of schemas
+        
+        Args:
+            schema (str): target schema name default=None
+            
+        Returns:
+            list: list of table names
+        """
+        return sorted(self.metadata_cache.table_names(schema))
+    
+    @_log_decorator 
+    def read_sql_table(self, table_name, schema=None, index_col=None, coerce_float=True, parse_dates=None, columns=None, chunksize=None, compact=False):
+        """
+        Read SQL database table into a DataFrame.
+    
+        Given a table name , returns a DataFrame.
+        This function does not support DBAPI connections.
+    
+        Parameters
+        ----------
+        table_name : str
+            Name of SQL table in database.
+        schema : str, default None
+            Name of SQL schema in database to query (if database flavor
+            supports this). Uses default schema if None (default).
+        index_col : str or list of str, optional, default: None
+            Column(s) to set as index(MultiIndex).
+        coerce_float : bool, default True
+            Attempts to convert values of non-string, non-numeric objects (like
+            decimal.Decimal) to floating point. Can result in loss of Precision.
+        parse_dates : list or dict, default None
+            - List of column names to parse as dates.
+            - Dict of ``{column_name: format string}`` where format string is
+              strftime compatible in case of parsing string times or is one of
+              (D, s, ns, ms, us) in case of parsing integer timestamps.
+            - Dict of ``{column_name: arg dict}``, where the arg dict corresponds
+              to the keyword arguments of :func:`pandas.to_datetime`
+              Especially useful with databases without native Datetime support,
+              such as SQLite.
+        columns : list, default None
+            List of column names to select from SQL table.
+        chunksize : int, default None
+            If specified, returns an iterator where `chunksize` is the number of
+            rows to include in each chunk. Start/end of the fetch and the row count
+            are logged while the iterator is consumed. Prefer PySQL.stream_sql_table
+            for bounded memory and stable dtypes across chunks.
+        compact : bool, default False
+            Convert columns to the smallest faithful dtypes of their stored/declared
+            sql types (see PySQL.compact_frame).
+    
+        Returns
+        -------
+        DataFrame or Iterator[DataFrame]
+            A SQL table is returned as two-dimensional data structure with labeled
+            axes.
+    
+        See Also
+        --------
+        read_sql_query : Read SQL query into a DataFrame.
+    
+        Notes
+        -----
+        Any datetime values with time zone information will be converted to UTC.
+    
+        Examples
+        --------
+        >>> pysql.read_sql_table('table_name')
+        """
+        result = pd.read_sql_table(table_name, con=self.engine, schema=schema, index_col=index_col, coerce_float=coerce_float, parse_dates=parse_dates, columns=columns, chunksize=chunksize)
+        if compact:
+            sql_types = self.compact_types([(schema, table_name)])
+            result = self.compact_frame(result, sql_types) if chunksize is None else (self.compact_frame(chunk, sql_types) for chunk in result)
+        return result if chunksize is None else self._logged_batches('read_sql_table', result)
+    
+    def read_sql_query(self, query, index_col=None, coerce_float=True, params=None, parse_dates=None, chunksize=None, dtype=None, cache=True, compact=False):
+        """
+        Read SQL query into a DataFrame.
+    
+        Returns a DataFrame corresponding to the result set of the query
+        string. Optionally provide an `index_col` parameter to use one of the
+        columns as the index, otherwise default integer index will be used.
+    
+        Parameters
+        ----------
+        query : str SQL query or SQLAlchemy Selectable (select or text object)
+            SQL query to be executed.
+        index_col : str or list of str, optional, default: None
+            Column(s) to set as index(MultiIndex).
         coerce_float : bool, default True
             Attempts to convert values of non-string, non-numeric objects (like
             decimal.Decimal) to floating point. Useful for SQL result sets.
@@ -368,10 +1706,19 @@ class PySQL():
               such as SQLite.
         chunksize : int, default None
             If specified, return an iterator where `chunksize` is the number of
-            rows to include in each chunk.
+            rows to include in each chunk. Start/end of the fetch and the row count
+            are logged while the iterator is consumed. Prefer PySQL.stream_sql_query
+            for bounded memory and stable dtypes across chunks.
         dtype : Type name or dict of columns
             Data type for data or columns. E.g. np.float64 or
             {‘a’: np.float64, ‘b’: np.int32, ‘c’: ‘Int64’}.
+        cache : bool, default True
+            Use PySQL.query_cache when it's enabled (PySQL.enable_query_cache),
+            cache hits are not queried and not logged (they're counted in PySQL.metrics).
+            chunksize reads are never cached.
+        compact : bool, default False
+            Convert columns to the smallest faithful dtypes of stored/declared sql types
+            of same name columns of the tables in FROM/JOIN clauses (see PySQL.compact_frame).
     
         Returns
         -------
@@ -389,39 +1736,1323 @@ class PySQL():
         --------
         >>> pysql.read_sql_query('SELECT * FROM TABLE_NAME')
         """
-        return pd.read_sql_query(query, con=self.engine, index_col=index_col, coerce_float=coerce_float, params=params, parse_dates=parse_dates, chunksize=chunksize, dtype=dtype)
+        query_cache = self.query_cache
+        if query_cache is None or not cache or chunksize is not None:
+            result = self._read_sql_query(query, index_col=index_col, coerce_float=coerce_float, params=params, parse_dates=parse_dates, chunksize=chunksize, dtype=dtype)
+            if result is None:
+                return result
+            if compact:
+                sql_types = self.compact_types(Query_cache.referenced_tables(Query_cache.make_key(query)[0]) or ())
+                result = self.compact_frame(result, sql_types) if chunksize is None else (self.compact_frame(chunk, sql_types) for chunk in result)
+            return result if chunksize is None else self._logged_batches('read_sql_query', result)
+        key = query_cache.make_key(query, params=params, index_col=index_col, coerce_float=coerce_float, parse_dates=parse_dates, dtype=dtype, compact=compact)
+        df, generation = query_cache.get(key)
+        if df is not None:
+            self.metrics.count('read_sql_query.cache_hits')
+            return df
+        df = self._read_sql_query(query, index_col=index_col, coerce_float=coerce_float, params=params, parse_dates=parse_dates, dtype=dtype)
+        if df is not None:
+            if compact:
+                df = self.compact_frame(df, self.compact_types(Query_cache.referenced_tables(key[0]) or ()))
+            query_cache.put(key, df, generation)
+        return df
+
+    def compact_types(self, tables):
+        """
+        Returns sql types of the columns of tables for PySQL.compact_frame
+        (stored dtypes over reflected column types, reflected types win when they map to another pandas dtype, e.g. stored dtypes of a same name table of another schema)
+
+        Args:
+            tables (iterable): (schema, table_name) pairs, tables which can't be reflected are skipped
+
+        Returns:
+            dict: {column_name: sqlalchemy type}
+        """
+        sql_types = {}
+        for schema, table_name in tables:
+            try:
+                reflected = {column['name']: column['type'] for column in self.metadata_cache.get_columns(table_name, schema=schema)}
+                stored = self.dtype_registry.get(table_name, schema=schema) or {}
+            except Exception:      # cte, temp table, ...
+                continue
+            stored = {column: sql_type for column, sql_type in stored.items()
+                      if column in reflected and self.sql_type_to_dtype(sql_type) == self.sql_type_to_dtype(reflected[column])}
+            sql_types = sql_types | reflected | stored
+        return sql_types
+
+    def compact_dtype(self, column_data, sql_type=None, category_ratio=0.5):
+        """
+        Returns the smallest faithful pandas dtype of a column
+            -BIT: bool (boolean with nulls)
+            -TINYINT/SMALLINT/INT/BIGINT: uint8/int16/int32/int64 (UInt8/Int16/Int32/Int64 with nulls), not changed when values are out of the type range
+            -REAL, FLOAT(1-24): float32 (other floats stay float64)
+            -CHAR/TEXT: category when unique values are not more than category_ratio of values, arrow backed string otherwise (needs pyarrow)
+            -unknown sql type: int64 is downcast by its values, text columns are handled like CHAR/TEXT
+
+        Args:
+            column_data (pandas series): column values
+            sql_type (sqlalchemy type, optional): declared/stored type (default is None --> unknown)
+            category_ratio (float, optional): max unique values ratio of category columns (default is 0.5)
+
+        Returns:
+            pandas dtype or None (column stays as it is)
+        """
+        has_nulls = bool(column_data.isna().any())
+        name = str(sql_type).upper() if sql_type is not None else ''
+        integer_types = [('BIGINT', 'int64'), ('SMALLINT', 'int16'), ('TINYINT', 'uint8'), ('INT', 'int32')]
+        if 'BIT' in name or 'BOOL' in name:
+            return 'boolean' if has_nulls else 'bool'
+        for sql_name, dtype in integer_types:
+            if sql_name in name:
+                values = column_data.dropna()
+                if len(values) and pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+                    if not (np.iinfo(dtype).min <= values.min() and values.max() <= np.iinfo(dtype).max):    # out of declared type, astype would wrap it
+                        return None
+                    if pd.api.types.is_float_dtype(values) and not (values == np.floor(values)).all():
+                        return None
+                return dtype.capitalize().replace('Uint', 'UInt') if has_nulls else dtype
+        if 'REAL' in name or ('FLOAT' in name and getattr(sql_type, 'precision', None) is not None and sql_type.precision <= 24):
+            return 'float32'
+        if 'CHAR' in name or 'TEXT' in name or (not name and pd.api.types.infer_dtype(column_data, skipna=True) == 'string'):
+            non_null_count = len(column_data) - int(column_data.isna().sum())
+            if non_null_count and column_data.nunique(dropna=True) <= category_ratio * non_null_count:
+                return 'category'
+            try:
+                import pyarrow
+            except ImportError:
+                return None
+            return 'string[pyarrow]'
+        if not name and column_data.dtype == 'int64' and len(column_data):
+            for dtype in ('int8', 'int16', 'int32'):
+                if np.iinfo(dtype).min <= column_data.min() and column_data.max() <= np.iinfo(dtype).max:
+                    return dtype
+        return None
+
+    def compact_frame(self, df, sql_types=None, category_ratio=0.5):
+        """
+        converts columns of a dataframe to their smallest faithful dtypes (see PySQL.compact_dtype)
+        columns which can't be converted (values out of declared type) are not changed
+
+        Args:
+            df (pandas dataframe): read dataframe
+            sql_types (dict, optional): {column_name: sqlalchemy type} (default is None --> by values)
+            category_ratio (float, optional): max unique values ratio of category columns (default is 0.5)
+
+        Returns:
+            pandas dataframe: new dataframe (unchanged columns are shared with df)
+        """
+        sql_types = sql_types or {}
+        compact_columns = {}
+        for column in df.columns:
+            dtype = self.compact_dtype(df[column], sql_types.get(column), category_ratio=category_ratio)
+            if dtype is None or df[column].dtype == dtype:
+                continue
+            try:
+                compact_columns[column] = df[column].astype(dtype)
+            except (TypeError, ValueError, OverflowError):
+                pass
+        return self._replace_columns(df, compact_columns) if compact_columns else df
+
+    def _read_sql_query(self, query, index_col=None, coerce_float=True, params=None, parse_dates=None, chunksize=None, dtype=None):
+        # the real read of PySQL.read_sql_query (logged as read_sql_query)
+        return pd.read_sql_query(query, con=self.engine, index_col=index_col, coerce_float=coerce_float, params=params, parse_dates=parse_dates, chunksize=chunksize, dtype=dtype)
+    _read_sql_query.__name__ = 'read_sql_query'
+    _read_sql_query = _log_decorator(_read_sql_query)
+
+    def enable_query_cache(self, max_bytes=256 * 1024 ** 2, ttl=300, spill_dir=None, max_disk_bytes=1024 ** 3):
+        """
+        enables result cache of PySQL.read_sql_query (see Query_cache), results of tables which are written by PySQL are dropped
+
+        Args:
+            max_bytes (int): memory budget default : 256MB
+            ttl (int/float): seconds to keep results (None --> until a write) default : 300
+            spill_dir (str): directory of spilled parquet files (needs pyarrow) default : None (evicted results are dropped)
+            max_disk_bytes (int): disk budget of spilled files default : 1GB
+
+        Returns:
+            None
+        """
+        self.disable_query_cache()
+        self.query_cache = Query_cache(max_bytes=max_bytes, ttl=ttl, spill_dir=spill_dir, max_disk_bytes=max_disk_bytes)
+
+    def disable_query_cache(self):
+        # drops cached results (and spilled files)
+        if self.query_cache is not None:
+            self.query_cache.invalidate()
+            self.query_cache = None
+
+    def table_written(self, table_name, schema=None):
+        # drops cached query results of a table after PySQL writes/DDLs
+        if self.query_cache is not None:
+            self.query_cache.invalidate(table_name, schema)
+
+    def sql_type_to_dtype(self, sql_type, dtype_backend='numpy'):
+        """
+        maps a sqlalchemy type (or python type of cursor description) to a pandas dtype
+
+        Args:
+            sql_type (sqlalchemy type / python type): column type
+            dtype_backend (str): numpy (numpy and pandas nullable dtypes) or pyarrow (arrow backed dtypes)
+
+        Returns:
+            pandas dtype or None (unknown type, column stays object)
+        """
+        if isinstance(sql_type, type) and not issubclass(sql_type, types.TypeEngine):
+            python_types = {bool: 'BIT', int: 'BIGINT', float: 'FLOAT', decimal.Decimal: 'FLOAT', str: 'NVARCHAR', datetime: 'DATETIME', date: 'DATE'}
+            sql_type = python_types.get(sql_type, '')
+        sql_type = str(sql_type).upper()
+        if dtype_backend == 'pyarrow':
+            try:
+                import pyarrow as pa
+            except ImportError:
+                raise Exception("pyarrow is needed for dtype_backend='pyarrow' --> pip install pyarrow")
+            arrow_types = [('BIGINT', pa.int64()), ('SMALLINT', pa.int16()), ('TINYINT', pa.uint8()), ('INT', pa.int32()), ('BIT', pa.bool_()), ('BOOL', pa.bool_()),
+                           ('REAL', pa.float32()), ('FLOAT', pa.float64()), ('DOUBLE', pa.float64()), ('NUMERIC', pa.float64()), ('DECIMAL', pa.float64()),
+                           ('DATETIME', pa.timestamp('ns')), ('TIMESTAMP', pa.timestamp('ns')), ('DATE', pa.date32()), ('CHAR', pa.string()), ('TEXT', pa.string())]
+            for name, arrow_type in arrow_types:
+                if name in sql_type:
+                    return pd.ArrowDtype(arrow_type)
+            return None
+        numpy_types = [('BIGINT', 'Int64'), ('SMALLINT', 'Int16'), ('TINYINT', 'UInt8'), ('INT', 'Int32'), ('BIT', 'boolean'), ('BOOL', 'boolean'),
+                       ('REAL', 'float32'), ('FLOAT', 'float64'), ('DOUBLE', 'float64'), ('NUMERIC', 'float64'), ('DECIMAL', 'float64'),
+                       ('DATETIME', 'datetime64[ns]'), ('TIMESTAMP', 'datetime64[ns]'), ('DATE', 'datetime64[ns]'), ('CHAR', 'string'), ('TEXT', 'string')]
+        for name, dtype in numpy_types:
+            if name in sql_type:
+                return dtype
+        return None
+
+    def _typed_batch(self, rows, keys, dtypes):
+        # rows of a fetchmany --> dataframe with dtypes (columns which can't be converted stay object)
+        batch = pd.DataFrame.from_records(rows, columns=keys, coerce_float=True)
+        for column, dtype in dtypes.items():
+            if dtype is not None and column in batch.columns:
+                try:
+                    batch[column] = batch[column].astype(dtype)
+                except (TypeError, ValueError):
+                    pass
+        return batch
+
+    def _stream(self, function_name, statement, params=None, fetch_size=10_000, sql_types=None, dtype=None, dtype_backend='numpy'):
+        # streams a statement result by a server side cursor, logs start and end (with row count) of the real fetch
+        return self._logged_batches(function_name, self._fetch_batches(statement, params=params, fetch_size=fetch_size, sql_types=sql_types, dtype=dtype, dtype_backend=dtype_backend))
+
+    def _fetch_batches(self, statement, params=None, fetch_size=10_000, sql_types=None, dtype=None, dtype_backend='numpy'):
+        # typed dataframes of fetch_size rows of a server side cursor
+        with self.engine.connect() as connection:
+            result = connection.execution_options(stream_results=True, max_row_buffer=fetch_size).execute(statement, params or {})
+            keys = list(result.keys())
+            if sql_types is None:
+                sql_types = {description[0]: description[1] for description in result.cursor.description}
+            dtypes = {key: self.sql_type_to_dtype(sql_types.get(key), dtype_backend=dtype_backend) for key in keys}
+            if dtype is not None:
+                dtypes = dtypes | (dtype if isinstance(dtype, dict) else {key: dtype for key in keys})
+            while True:
+                rows = result.fetchmany(fetch_size)
+                if not rows:
+                    break
+                yield self._typed_batch(rows, keys, dtypes)
+
+    def _logged_batches(self, function_name, batches):
+        # iterates batches (dataframes), logs start at the first fetch and end (with row count) when batches are exhausted or the iterator is closed
+        process_id = self.next_process_id()
+        self.logger(function_name, 'start', 'success', process_id=process_id)
+        rows_count = 0
+        start, state, error = time.perf_counter(), 'success', None
+        try:
+            for batch in batches:
+                rows_count += len(batch)
+                yield batch
+        except GeneratorExit:
+            self.logger(function_name, 'end', f'stopped after {rows_count} rows', process_id=process_id)
+            raise
+        except Exception as Error:
+            state, error = 'error', f'{type(Error).__name__}: {Error}'
+            self.logger(function_name, 'progress', str(Error), process_id=process_id)
+            raise
+        finally:
+            if hasattr(batches, 'close'):
+                batches.close()    # releases the cursor/connection of a stopped iterator
+            self.metrics.record({'function': function_name, 'process_id': process_id, 'state': state, 'error': error, 'seconds': time.perf_counter() - start,
+                                 'rows_in': None, 'rows_out': rows_count, 'bytes_in': None, 'bytes_out': None, 'stages': {}})
+        self.logger(function_name, 'end', f'{rows_count} rows', process_id=process_id)
+
+    def stream_sql_table(self, table_name, schema=None, columns=None, fetch_size=10_000, dtype_backend='numpy'):
+        """
+        Read SQL database table as an iterator of typed DataFrames with bounded memory.
+        a server side cursor fetches fetch_size rows each time, column dtypes come from stored 'config'.'dtypes'
+        of the table (PySQL.create_dtypes) or the table columns. start/end of the fetch and row count are logged.
+
+        Args:
+            table_name (str): target table name
+            schema (str): target schema name default=None
+            columns (list): columns to select default=None (all columns)
+            fetch_size (int): rows of each DataFrame default=10_000
+            dtype_backend (str): numpy (numpy and pandas nullable dtypes) or pyarrow (arrow backed dtypes) default=numpy
+
+        Returns:
+            Iterator[DataFrame]
+
+        Examples:
+            >>> for batch in pysql.stream_sql_table('table_name', fetch_size=50_000):
+            ...     process(batch)
+        """
+        reflected_columns = self.metadata_cache.get_columns(table_name, schema=schema)
+        sql_types = {column['name']: column['type'] for column in reflected_columns}
+        try:
+            sql_types = sql_types | self.fetch_dtypes(table_name, schema=schema)
+        except Exception:
+            pass
+        table = self.reflected_table(table_name, schema=schema)
+        statement = select(table) if columns is None else select(*[table.c[column] for column in columns])
+        return self._stream('stream_sql_table', statement, fetch_size=fetch_size, sql_types=sql_types, dtype_backend=dtype_backend)
+
+    def reflected_table(self, table_name, schema=None):
+        """
+        Returns a sqlalchemy Table of an existing table built from cached reflected columns (PySQL.metadata_cache)
+
+        Args:
+            table_name (str): target table name
+            schema (str): target schema name default=None
+
+        Returns:
+            sqlalchemy Table
+        """
+        reflected_columns = self.metadata_cache.get_columns(table_name, schema=schema)
+        return Table(table_name, MetaData(), *[Column(column['name'], column['type'], nullable=column.get('nullable', True)) for column in reflected_columns], schema=schema)
+
+    def partition_bounds(self, table_name, partition_column, schema=None, partitions=4, split='range'):
+        """
+        calculates inner boundaries which split a table into partitions by a column
+
+        Args:
+            table_name (str): target table name
+            partition_column (str): integer, float or date/datetime column (primary key is suggested)
+            schema (str): target schema name default=None
+            partitions (int): number of partitions default=4
+            split (str): range (equal width between min and max) or ntile (equal row counts, needs a scan of the column) default=range
+
+        Returns:
+            list: sorted boundaries (partitions - 1 values or less)
+        """
+        column = self.reflected_table(table_name, schema=schema).c[partition_column]
+        with self.engine.connect() as connection:
+            if split == 'ntile':
+                tiles = select(column.label('value'), func.ntile(partitions).over(order_by=column).label('tile')).where(column.isnot(None)).subquery()
+                starts = connection.execute(select(func.min(tiles.c.value)).group_by(tiles.c.tile).order_by(func.min(tiles.c.value))).scalars().all()
+                return list(dict.fromkeys(starts[1:]))
+            elif split != 'range':
+                raise Exception(f"unknown split '{split}' use range/ntile")
+            min_value, max_value = connection.execute(select(func.min(column), func.max(column))).one()
+        if min_value is None or min_value == max_value:
+            return []
+        if isinstance(min_value, (datetime, date)):
+            edges = np.linspace(pd.Timestamp(min_value).value, pd.Timestamp(max_value).value, partitions + 1)[1:-1]
+            edges = [pd.Timestamp(int(edge)).to_pydatetime() for edge in edges]
+        elif isinstance(min_value, (int, np.integer)):
+            edges = [int(edge) for edge in np.ceil(np.linspace(min_value, max_value, partitions + 1)[1:-1])]
+        else:
+            edges = [float(edge) for edge in np.linspace(float(min_value), float(max_value), partitions + 1)[1:-1]]
+        return list(dict.fromkeys(edges))
+
+    def partition_statements(self, table_name, partition_column=None, schema=None, columns=None, partitions=4, split='range'):
+        """
+        creates select statements of table partitions in partition column order (rows with null partition column are the last partition)
+
+        Args:
+            table_name (str): target table name
+            partition_column (str): integer, float or date/datetime column default=None (first primary key column)
+            schema (str): target schema name default=None
+            columns (list): columns to select default=None (all columns)
+            partitions (int): number of partitions default=4
+            split (str): range/ntile, see PySQL.partition_bounds default=range
+
+        Returns:
+            list: sqlalchemy select statements
+        """
+        if partition_column is None:
+            primary_key = self.metadata_cache.get_primary_key(table_name, schema=schema)
+            if not primary_key:
+                raise Exception(f"{table_name} has no primary key, use partition_column='column_name'")
+            partition_column = primary_key[0]
+        table = self.reflected_table(table_name, schema=schema)
+        column = table.c[partition_column]
+        statement = select(table) if columns is None else select(*[table.c[name] for name in columns])
+        edges = self.partition_bounds(table_name, partition_column, schema=schema, partitions=partitions, split=split)
+        lower_bounds = [None] + edges
+        upper_bounds = edges + [None]
+        statements = []
+        for lower_bound, upper_bound in zip(lower_bounds, upper_bounds):
+            conditions = [column.isnot(None)]
+            if lower_bound is not None:
+                conditions.append(column >= lower_bound)
+            if upper_bound is not None:
+                conditions.append(column < upper_bound)
+            statements.append(statement.where(and_(*conditions)))
+        if column.nullable:
+            statements.append(statement.where(column.is_(None)))
+        return statements
+
+    def iter_sql_table_partitions(self, table_name, partition_column=None, schema=None, columns=None, partitions=4, workers=4, split='range', coerce_float=True, parse_dates=None):
+        """
+        reads table partitions concurrently (thread pool over the engine connection pool) and yields them as they finish
+        start/end of the read and row count are logged
+
+        Args:
+            table_name (str): target table name
+            partition_column (str): integer, float or date/datetime column default=None (first primary key column)
+            schema (str): target schema name default=None
+            columns (list): columns to select default=None (all columns)
+            partitions (int): number of partitions default=4
+            workers (int): number of concurrent reads default=4 (more than engine pool size + max overflow waits for connections)
+            split (str): range (equal width) or ntile (equal row counts) default=range
+            coerce_float (bool), parse_dates (list or dict): same as PySQL.read_sql_table
+
+        Returns:
+            Iterator[(int, DataFrame)]: (partition number in partition column order, partition dataframe)
+        """
+        statements = self.partition_statements(table_name, partition_column=partition_column, schema=schema, columns=columns, partitions=partitions, split=split)
+        if parse_dates is None:   # same as read_sql_table, date columns are parsed
+            parse_dates = [column.name for column in statements[0].selected_columns if isinstance(column.type, (types.Date, types.DateTime))]
+        process_id = self.next_process_id()
+        self.logger('iter_sql_table_partitions', 'start', 'success', process_id=process_id)
+        rows_count = 0
+        start, state, error = time.perf_counter(), 'success', None
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(pd.read_sql_query, statement, con=self.engine, coerce_float=coerce_float, parse_dates=parse_dates): number
+                           for number, statement in enumerate(statements)}
+                try:
+                    for future in as_completed(futures):
+                        partition = future.result()
+                        rows_count += len(partition)
+                        yield futures[future], partition
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+        except GeneratorExit:
+            self.logger('iter_sql_table_partitions', 'end', f'stopped after {rows_count} rows', process_id=process_id)
+            raise
+        except Exception as Error:
+            state, error = 'error', f'{type(Error).__name__}: {Error}'
+            self.logger('iter_sql_table_partitions', 'progress', str(Error), process_id=process_id)
+            raise
+        finally:
+            self.metrics.record({'function': 'iter_sql_table_partitions', 'process_id': process_id, 'state': state, 'error': error,
+                                 'seconds': time.perf_counter() - start, 'rows_in': None, 'rows_out': rows_count, 'bytes_in': None, 'bytes_out': None, 'stages': {}})
+        self.logger('iter_sql_table_partitions', 'end', f'{rows_count} rows of {len(statements)} partitions', process_id=process_id)
+
+    @_log_decorator
+    def read_sql_table_parallel(self, table_name, partition_column=None, schema=None, columns=None, partitions=4, workers=4, split='range', coerce_float=True, parse_dates=None, compact=False):
+        """
+        Read SQL database table into a DataFrame by concurrent reads of its partitions (see PySQL.iter_sql_table_partitions)
+        partitions are concatenated in partition column order
+
+        Args:
+            table_name (str): target table name
+            partition_column (str): integer, float or date/datetime column default=None (first primary key column)
+            schema (str): target schema name default=None
+            columns (list): columns to select default=None (all columns)
+            partitions (int): number of partitions default=4
+            workers (int): number of concurrent reads default=4
+            split (str): range (equal width) or ntile (equal row counts) default=range
+            compact (bool): convert columns to the smallest faithful dtypes (see PySQL.compact_frame) default=False
+
+        Returns:
+            DataFrame
+
+        Examples:
+            >>> pysql.read_sql_table_parallel('table_name', partition_column='id', partitions=16, workers=8)
+        """
+        partitions = dict(self.iter_sql_table_partitions(table_name, partition_column=partition_column, schema=schema, columns=columns, partitions=partitions,
+                                                         workers=workers, split=split, coerce_float=coerce_float, parse_dates=parse_dates))
+        partitions = [partitions[number] for number in sorted(partitions)]
+        df = pd.concat([partition for partition in partitions if len(partition)] or partitions[:1], ignore_index=True).infer_objects()
+        return self.compact_frame(df, self.compact_types([(schema, table_name)])) if compact else df
+
+    def stream_sql_query(self, query, params=None, fetch_size=10_000, dtype=None, dtype_backend='numpy'):
+        """
+        Read SQL query as an iterator of typed DataFrames with bounded memory.
+        a server side cursor fetches fetch_size rows each time, column dtypes come from cursor description
+        start/end of the fetch and row count are logged.
+
+        Args:
+            query (str or sqlalchemy selectable): SQL query to be executed.
+            params (dict): query parameters (sqlalchemy :name style for str queries) default=None
+            fetch_size (int): rows of each DataFrame default=10_000
+            dtype (dtype or dict of columns): overrides column dtypes default=None
+            dtype_backend (str): numpy (numpy and pandas nullable dtypes) or pyarrow (arrow backed dtypes) default=numpy
+
+        Returns:
+            Iterator[DataFrame]
+        """
+        statement = text(query) if isinstance(query, str) else query
+        return self._stream('stream_sql_query', statement, params=params, fetch_size=fetch_size, dtype=dtype, dtype_backend=dtype_backend)
     
     def date_has_time(self, column_data):
         non_null_values = column_data.dropna()
-        for date in non_null_values:
-            if date.hour != 0:
-                return True
-        return False
-    
-    def date_normalizer(self, df):
-        for key, value in self.dtypes.items():
-            if 'DATE' in str(value):
-                df[key] = pd.to_datetime(df[key])
-                has_time = self.date_has_time(df[key])
-                if has_time:
-                    df[key] = df[key].apply(lambda x:x.isoformat().split('+')[0].replace('T',' '))
-                else:
-                    df[key] = df[key].apply(lambda x:x.isoformat().split('+')[0].split('T')[0])
+        return bool((non_null_values != non_null_values.dt.normalize()).any())
+
+    def _replace_columns(self, df, columns):
+        # new dataframe sharing unchanged columns with df (df is not changed), new column names are appended
+        if not columns:
+            return df
+        new_columns = {column: df[column] for column in df.columns}
+        new_columns.update(columns)
+        return pd.DataFrame(new_columns, index=df.index, copy=False)
+
+    def preprocess(self, df, date_normalizer=True, text_cutter=True, dtypes=None):
+        """
+        prepares a dataframe for PySQL.to_sql without changing it
+        adds process_id column, runs date_normalizer/text_cutter and stores per column stats in PySQL.preprocess_report
+
+        Args:
+            df (pandas dataframe/series): data which is going to be inserted
+            date_normalizer (bool): run PySQL.date_normalizer
+            text_cutter (bool): run PySQL.text_cutter
+            dtypes (dict, optional): {column_name: sqlalchemy type} (default is None --> PySQL.dtypes)
+
+        Returns:
+            pandas dataframe: new dataframe (unchanged columns are shared with df)
+        """
+        self.preprocess_report = []
+        if isinstance(df, pd.Series):
+            df = df.to_frame()
+        df = self._replace_columns(df, {'process_id': pd.Series(np.full(len(df), self.current_process_id()), index=df.index)})
+        if date_normalizer:
+            df = self.date_normalizer(df, report=self.preprocess_report, dtypes=dtypes)
+        if text_cutter:
+            df = self.text_cutter(df, report=self.preprocess_report, dtypes=dtypes)
         return df
+
+    def date_normalizer(self, df, report=None, dtypes=None):
+        """
+        converts DATE/DATETIME columns (by PySQL.dtypes) to datetime64 without timezone, columns without time part are normalized to midnight
+        values are sent as native datetimes to the driver ('changed' of the report counts values whose timezone was dropped)
+
+        Args:
+            df (pandas dataframe): input dataframe (it's not changed)
+            report (list, optional): per column stats are appended to it
+            dtypes (dict, optional): {column_name: sqlalchemy type} (default is None --> PySQL.dtypes)
+
+        Returns:
+            pandas dataframe: new dataframe
+        """
+        columns = {}
+        for key, value in (self.dtypes if dtypes is None else dtypes).items():
+            if 'DATE' in str(value) and key in df.columns:
+                start = time.perf_counter()
+                column_data = pd.to_datetime(df[key])
+                changed = 0
+                if column_data.dt.tz is not None:
+                    changed = int(column_data.notna().sum())
+                    column_data = column_data.dt.tz_localize(None)
+                has_time = self.date_has_time(column_data)
+                if not has_time:
+                    column_data = column_data.dt.normalize()      # values are midnights already (date_has_time), not counted as changed
+                columns[key] = column_data
+                if report is not None:
+                    report.append({'column': key, 'step': 'date_normalizer', 'rows': len(column_data), 'nulls': int(column_data.isna().sum()),
+                                   'changed': changed, 'has_time': has_time, 'seconds': time.perf_counter() - start})
+        return self._replace_columns(df, columns)
     
+    @staticmethod
+    def is_varchar(dtype):
+        # VARCHAR/NVARCHAR types (classes or instances), checked by class because str() of VARCHAR('max') can't be compiled
+        dtype = dtype if isinstance(dtype, type) else type(dtype)
+        return issubclass(dtype, types.String) and not issubclass(dtype, (types.Text, types.CHAR, types.NCHAR))
+
     def cutter_n_finder(self, dtype):
-        n = str(dtype).split('(')[1][:-1]
-        return int(n)
+        # N of VARCHAR/NVARCHAR(N), None for unsized types (VARCHAR/NVARCHAR(max)) which have nothing to cut
+        length = getattr(dtype, 'length', None)
+        return length if isinstance(length, int) else None
             
-    def text_cutter(self, df):
-        for key, value in self.dtypes.items():
-            if 'VARCHAR' in str(value):
+    def text_cutter(self, df, report=None, dtypes=None):
+        """
+        cuts texts longer than VARCHAR/NVARCHAR(N) columns capacity (by PySQL.dtypes), non-text values are converted to text and nulls are kept
+        unsized (max) columns are not cut
+
+        Args:
+            df (pandas dataframe): input dataframe (it's not changed)
+            report (list, optional): per column stats are appended to it
+            dtypes (dict, optional): {column_name: sqlalchemy type} (default is None --> PySQL.dtypes)
+
+        Returns:
+            pandas dataframe: new dataframe
+        """
+        columns = {}
+        for key, value in (self.dtypes if dtypes is None else dtypes).items():
+            if self.is_varchar(value) and key in df.columns:
+                start = time.perf_counter()
                 N = self.cutter_n_finder(value)
-                df[key] = df[key].apply(lambda x:str(x)[:N] if len(str(x))> N else str(x))
-        return df
+                column_data = df[key]
+                inferred = pd.api.types.infer_dtype(column_data, skipna=True)
+                if inferred not in ('string', 'empty'):
+                    column_data = column_data.astype(object).where(column_data.isna(), column_data.astype(str))
+                    columns[key] = column_data
+                changed = int((column_data.str.len() > N).sum()) if inferred != 'empty' and N is not None else 0
+                if changed:
+                    column_data = column_data.str.slice(0, N)
+                    columns[key] = column_data
+                if report is not None:
+                    report.append({'column': key, 'step': 'text_cutter', 'rows': len(column_data), 'nulls': int(column_data.isna().sum()),
+                                   'changed': changed, 'has_time': None, 'seconds': time.perf_counter() - start})
+        return self._replace_columns(df, columns)
         
+    def create_schema(self, schema):
+        """
+        creates a schema and adds it to the metadata cache
+
+        Args:
+            schema (str): schema name
+
+        Returns:
+            None
+        """
+        with self.measure_stage('ddl'):
+            self.engine.execute(sqlalchemy_schema.CreateSchema(schema))
+        self.metadata_cache.add_schema(schema)
+
+    def estimate_row_width(self, df, index=True, dtypes=None):
+        """
+        estimating the bytes of one row for sizing insert batches (uses PySQL.dtypes for text columns)
+
+        Args:
+            df (pandas dataframe): dataframe which is going to be inserted
+            index (bool): index is written as column(s) or not
+            dtypes (dict, optional): {column_name: sqlalchemy type} (default is None --> PySQL.dtypes)
+
+        Returns:
+            int: estimated row width in bytes
+        """
+        row_width = 8 * df.index.nlevels if index else 0
+        for column in df.columns:
+            sql_type = (self.dtypes if dtypes is None else dtypes).get(column)
+            length = self.cutter_n_finder(sql_type) if sql_type is not None and self.is_varchar(sql_type) else None
+            if length is not None:
+                row_width += length * (2 if isinstance(sql_type, types.Unicode) else 1)
+            elif df[column].dtype == object:
+                row_width += 2 * 255
+            else:
+                row_width += max(df[column].dtype.itemsize, 8)
+        return row_width
+
+    def insert_plan(self, df, insert_method='auto', chunksize=None, index=True, dtypes=None):
+        """
+        choosing pandas insert method and batch size for PySQL.to_sql
+
+        Args:
+            df (pandas dataframe): dataframe which is going to be inserted
+            insert_method (str/callable): auto/fast_executemany/multi_values/default or pandas method callable
+            chunksize (int, optional): rows of each batch (default is None --> calculated from column count and row width)
+            index (bool): index is written as column(s) or not
+            dtypes (dict, optional): {column_name: sqlalchemy type} (default is None --> PySQL.dtypes)
+
+        Returns:
+            tuple: (pandas to_sql method, chunksize)
+        """
+        if callable(insert_method):
+            return insert_method, chunksize
+        if insert_method == 'auto':
+            insert_method = 'fast_executemany' if self.engine.dialect.driver == 'pyodbc' else 'multi_values'
+
+        column_count = len(df.columns) + (df.index.nlevels if index else 0)
+        if insert_method == 'fast_executemany':
+            if chunksize is None:
+                chunksize = max(1, self.insert_buffer_bytes // self.estimate_row_width(df, index=index, dtypes=dtypes))
+            return self._fast_executemany_insert, chunksize
+        elif insert_method == 'multi_values':
+            if chunksize is None:
+                chunksize = max(1, min(self.max_values_rows, (self.max_parameters - 1) // column_count))
+            return 'multi', chunksize
+        elif insert_method == 'default':
+            return None, chunksize
+        raise Exception(f"unknown insert_method '{insert_method}' use auto/fast_executemany/multi_values/bulk/default")
+
+    def _fast_executemany_insert(self, pd_table, conn, keys, data_iter):
+        # pandas insert method: one executemany per batch, with pyodbc parameter arrays when available
+        insert_query = str(pd_table.table.insert().compile(dialect=conn.dialect))
+        rows = list(data_iter)
+        processors = [pd_table.table.columns[key].type.dialect_impl(conn.dialect).bind_processor(conn.dialect) for key in keys]
+        if any(processors) and rows:
+            columns = [list(map(processor, column)) if processor else column for processor, column in zip(processors, zip(*rows))]
+            rows = list(zip(*columns))
+        cursor = conn.connection.cursor()
+        try:
+            if hasattr(cursor, 'fast_executemany'):
+                cursor.fast_executemany = True
+            cursor.executemany(insert_query, rows)
+        finally:
+            cursor.close()
+        return len(rows)
+
+    def bulk_insert(self, df, table_name, schema=None, if_exists='append', index=True, index_label=None, staging_dir=None, dtypes=None, connection=None):
+        """
+        inserting a dataframe by BULK INSERT from a staged csv file
+        the staging file must be reachable by sql server with the same path (shared folder or same machine)
+
+        Args:
+            df (pandas dataframe): dataframe which is going to be inserted
+            table_name (str): target table name
+            schema (str): target schema name default=None
+            if_exists (str): fail/replace/append (table is created by pandas from PySQL.dtypes)
+            index (bool): index is written as column(s) or not
+            index_label (str or sequence, optional): column label for index column(s)
+            staging_dir (str, optional): staging directory (default is the temp directory)
+            dtypes (dict, optional): {column_name: sqlalchemy type} (default is None --> PySQL.dtypes)
+            connection (sqlalchemy connection, optional): connection of the statements (default is None --> PySQL.engine)
+
+        Returns:
+            int: number of inserted rows
+        """
+        connection = self.engine if connection is None else connection
+        df.head(0).to_sql(name=table_name, con=connection, schema=schema, if_exists=if_exists, index=index, index_label=index_label, dtype=self.dtypes if dtypes is None else dtypes)
+        staging_dir = tempfile.gettempdir() if staging_dir is None else staging_dir
+        staging_file = os.path.join(staging_dir, f'pysql_{table_name}_{uuid.uuid4().hex}.csv')
+        try:
+            self.write_bulk_file(df, staging_file, index=index, dtypes=dtypes)
+            full_table_name = f'[{schema}].[{table_name}]' if schema != None else f'[{table_name}]'
+            QUERY = f"""BULK INSERT {full_table_name} FROM '{staging_file}'
+                        WITH (FORMAT = 'CSV', CODEPAGE = '65001', FIELDTERMINATOR = ',', ROWTERMINATOR = '0x0a', KEEPNULLS, TABLOCK)"""
+            connection.execute(QUERY)
+        finally:
+            if os.path.exists(staging_file):
+                os.remove(staging_file)
+        return len(df)
+
+    def write_bulk_file(self, df, path, index=True, dtypes=None):
+        """
+        writes the staging csv file of PySQL.bulk_insert (rows end with '\\n' on every os)
+            -bool columns --> 1/0
+            -datetime columns --> ISO 8601 texts with the fraction their sql type keeps
+             (DATE: no time, SMALLDATETIME: seconds, DATETIME: milliseconds, DATETIME2/DATETIMEOFFSET: microseconds)
+            -empty texts --> "" (nulls are empty fields, KEEPNULLS loads them as NULL)
+
+        Args:
+            df (pandas dataframe): preprocessed dataframe
+            path (str): csv file path
+            index (bool): index is written as column(s) or not
+            dtypes (dict, optional): {column_name: sqlalchemy type} (default is None --> PySQL.dtypes)
+
+        Returns:
+            None
+        """
+        dtypes = self.dtypes if dtypes is None else dtypes
+        df = df.reset_index() if index else df
+        columns = {}
+        empty_text = f'\x1fpysql_empty_{uuid.uuid4().hex}\x1f'      # unique unquoted field, replaced by "" in the file
+        has_empty_texts = False
+        for number, column in enumerate(df.columns):
+            column_data = df.iloc[:, number]
+            sql_type = str(dtypes.get(column, '')).upper()
+            if pd.api.types.is_bool_dtype(column_data.dtype):
+                columns[number] = column_data.astype('Int8')
+            elif pd.api.types.is_datetime64_any_dtype(column_data.dtype):
+                if sql_type.startswith('DATE') and not sql_type.startswith('DATETIME'):
+                    columns[number] = column_data.dt.strftime('%Y-%m-%d')
+                elif 'SMALLDATETIME' in sql_type:
+                    columns[number] = column_data.dt.strftime('%Y-%m-%dT%H:%M:%S')
+                elif 'DATETIME2' in sql_type or 'DATETIMEOFFSET' in sql_type or 'TIMESTAMP' in sql_type:
+                    columns[number] = column_data.dt.strftime('%Y-%m-%dT%H:%M:%S.%f')
+                else:
+                    columns[number] = column_data.dt.strftime('%Y-%m-%dT%H:%M:%S.%f').str[:-3]
+            elif pd.api.types.is_object_dtype(column_data.dtype) or pd.api.types.is_string_dtype(column_data.dtype):
+                empty_mask = (column_data == '').fillna(False).to_numpy(dtype=bool)
+                if empty_mask.any():
+                    columns[number] = column_data.astype(object).mask(empty_mask, empty_text)
+                    has_empty_texts = True
+        if columns:
+            df = pd.DataFrame({number: columns.get(number, df.iloc[:, number]) for number in range(len(df.columns))}, index=df.index, copy=False)
+        if not has_empty_texts:
+            df.to_csv(path, index=False, header=False, encoding='utf-8', lineterminator='\n')
+            return
+        df.to_csv(path + '.tmp', index=False, header=False, encoding='utf-8', lineterminator='\n')
+        try:
+            with open(path + '.tmp', encoding='utf-8', newline='') as source, open(path, 'w', encoding='utf-8', newline='') as target:
+                for line in source:
+                    target.write(line.replace(empty_text, '""'))
+        finally:
+            os.remove(path + '.tmp')
+
+    @staticmethod
+    def encode_watermark(value):
+        # watermarks are stored as text (iso format for dates)
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, (int, np.integer)):
+            return str(int(value))
+        return str(value)
+
+    @staticmethod
+    def decode_watermark(value, sql_type):
+        # stored watermark text --> python value of the watermark column type
+        if value is None:
+            return None
+        if isinstance(sql_type, types.DateTime):
+            return datetime.fromisoformat(value)
+        if isinstance(sql_type, types.Date):
+            return date.fromisoformat(value)
+        if isinstance(sql_type, types.Integer):
+            return int(value)
+        if isinstance(sql_type, types.Float):
+            return float(value)
+        if isinstance(sql_type, types.Numeric):
+            return decimal.Decimal(value)
+        return value
+
+    def read_watermark(self, sync_name):
+        """
+        Returns stored high-water mark of a sync ('config'.'watermarks')
+
+        Args:
+            sync_name (str): sync name (see PySQL.sync_table)
+
+        Returns:
+            dict or None: {'watermark_column', 'watermark' (text), 'rows', 'process_id', 'datetime'}, None when it's not synced yet
+        """
+        if not self.metadata_cache.has_table('watermarks', 'config'):
+            return None
+        row = self.engine.execute(select(self.watermarks_table).where(self.watermarks_table.c.sync_name == sync_name)).first()
+        return None if row is None else {key: row[key] for key in self.watermarks_types if key != 'sync_name'}
+
+    def create_watermarks_table(self):
+        # creates 'config'.'watermarks' (and 'config' schema) if it's not created yet
+        if self.metadata_cache.has_table('watermarks', 'config'):
+            return
+        if not self.metadata_cache.has_schema('config'):
+            self.create_schema('config')
+        with self.watermarks_table_lock:    # concurrent loads (PySQL.load_files) would all create the table
+            if self.metadata_cache.has_table('watermarks', 'config'):
+                return
+            with self.measure_stage('ddl'):
+                pd.DataFrame(columns=list(self.watermarks_types)).to_sql('watermarks', con=self.engine, schema='config', if_exists='append', dtype=self.watermarks_types, index=False)
+            self.metadata_cache.add_table('watermarks', 'config')
+
+    def write_watermark(self, sync_name, watermark_column, watermark, rows, connection=None):
+        """
+        stores (advances) high-water mark of a sync, pass the connection of the written rows to advance it in their transaction
+
+        Args:
+            sync_name (str): sync name
+            watermark_column (str): monotonic column of the source table
+            watermark: last synced value of watermark_column
+            rows (int): rows synced in total (all syncs)
+            connection (sqlalchemy connection, optional): default is None --> PySQL.engine
+
+        Returns:
+            None
+        """
+        connection = self.engine if connection is None else connection
+        values = {'watermark_column': watermark_column, 'watermark': self.encode_watermark(watermark), 'rows': rows,
+                  'process_id': self.current_process_id(), 'datetime': datetime.now().replace(microsecond=0)}
+        result = connection.execute(self.watermarks_table.update().where(self.watermarks_table.c.sync_name == sync_name).values(**values))
+        if result.rowcount == 0:
+            connection.execute(self.watermarks_table.insert().values(sync_name=sync_name, **values))
+
+    @_log_decorator
+    def reset_watermark(self, sync_name):
+        """
+        drops stored high-water mark of a sync (next PySQL.sync_table copies all rows again)
+
+        Args:
+            sync_name (str): sync name
+
+        Returns:
+            None
+        """
+        if self.metadata_cache.has_table('watermarks', 'config'):
+            self.engine.execute(self.watermarks_table.delete().where(self.watermarks_table.c.sync_name == sync_name))
+
+    @_log_decorator
+    def sync_table(self, source_table, target_table, watermark_column='process_id', source_schema=None, target_schema=None, sync_name=None, chunksize=50_000,
+                   if_exists='append', primary_key=None, date_normalizer=True, text_cutter=True, insert_method='auto', dtype=None):
+        """
+        incremental sync : copies rows of source table which are past the stored high-water mark of watermark_column to target table
+        rows are read in chunks ordered by watermark_column (rows of one watermark value are never split between chunks),
+        every chunk is preprocessed like PySQL.to_sql and the mark is advanced in the same transaction as its insert,
+        so a failed sync continues from its last committed chunk. mark is kept in 'config'.'watermarks'
+
+        Args:
+            source_table (str): source table name
+            target_table (str): target table name
+            watermark_column (str): monotonic column of source table (process_id, identity or datetime column) default=process_id
+            source_schema (str): source schema name default=None
+            target_schema (str): target schema name default=None
+            sync_name (str, optional): name of the stored mark (default is 'source_schema.source_table->target_schema.target_table')
+            chunksize (int): rows of each chunk default=50_000
+            if_exists (str): append/upsert (upsert is idempotent, its mark is advanced after the MERGE) default=append
+            primary_key (str or list, optional): key columns of upsert
+            date_normalizer, text_cutter, insert_method, dtype: same as PySQL.to_sql
+
+        Returns:
+            dict: {'rows': rows synced by this call, 'chunks': chunks count, 'watermark': last synced value}
+
+        Examples:
+            >>> pysql.sync_table('orders', 'orders', source_schema='stage', target_schema='dw', watermark_column='order_id')
+        """
+        if if_exists not in ('append', 'upsert'):
+            raise Exception(f"if_exists of sync_table must be append or upsert, not {if_exists}")
+        sync_name = f'{source_schema}.{source_table}->{target_schema}.{target_table}' if sync_name is None else sync_name
+        source = self.reflected_table(source_table, schema=source_schema)
+        column = source.c[watermark_column]
+        parse_dates = [source_column.name for source_column in source.c if isinstance(source_column.type, (types.Date, types.DateTime))]
+        self.create_watermarks_table()
+
+        stored = self.read_watermark(sync_name)
+        if stored is not None and stored['watermark_column'] != watermark_column:
+            raise Exception(f"{sync_name} is synced by {stored['watermark_column']}, use reset_watermark('{sync_name}') to change watermark column")
+        watermark = None if stored is None else self.decode_watermark(stored['watermark'], column.type)
+        total_rows = 0 if stored is None else int(stored['rows'])
+        if dtype is None:
+            dtype = self.dtype_registry.get(target_table, schema=target_schema)
+        dtypes = (self.dtypes if dtype is None else dtype) | {'process_id':types.INT()}
+
+        high = self.engine.execute(select(func.max(column))).scalar()   # rows added during the sync are left to the next one
+        rows, chunks = 0, 0
+        while high is not None:
+            condition = column <= high if watermark is None else and_(column > watermark, column <= high)
+            first_values = select(column.label('value')).where(condition).order_by(column).limit(chunksize).subquery()
+            upper = self.engine.execute(select(func.max(first_values.c.value))).scalar()
+            if upper is None:
+                break
+            with self.measure_stage('read'):
+                chunk = pd.read_sql_query(select(source).where(and_(condition, column <= upper)), con=self.engine, parse_dates=parse_dates)
+            with self.measure_stage('preprocess'):
+                df = self.preprocess(chunk, date_normalizer=date_normalizer, text_cutter=text_cutter, dtypes=dtypes)
+            if if_exists == 'upsert' and self.metadata_cache.has_table(target_table, target_schema):
+                self.upsert(df, target_table, schema=target_schema, index=False, primary_key=primary_key, insert_method=insert_method, dtypes=dtypes)
+                self.write_watermark(sync_name, watermark_column, upper, total_rows + len(df))
+            else:
+                with self.engine.begin() as connection:
+                    self.insert(df, target_table, schema=target_schema, index=False, insert_method=insert_method, dtypes=dtypes, connection=connection)
+                    self.write_watermark(sync_name, watermark_column, upper, total_rows + len(df), connection=connection)
+                self.table_written(target_table, target_schema)    # results read before the commit
+            watermark, rows, total_rows, chunks = upper, rows + len(df), total_rows + len(df), chunks + 1
+            self.logger('sync_table', 'progress', f'{sync_name} chunk {chunks}: {len(df)} rows, watermark {self.encode_watermark(upper)}')
+        return {'rows': rows, 'chunks': chunks, 'watermark': watermark}
+
+    def _background(self, iterable, queue_size=4):
+        """
+        iterates an iterable in a background thread through a bounded queue (a pipeline stage)
+        the producer waits when queue_size items are not consumed, its errors are raised in the consumer
+
+        Args:
+            iterable (iterable): stage items
+            queue_size (int, optional): max waiting items (default is 4)
+
+        Returns:
+            generator: items of iterable
+        """
+        items = queue.Queue(maxsize=queue_size)
+        stop = threading.Event()
+        done = object()
+        process_id = self.current_process_id()
+
+        def put(item):
+            # waits for a free slot until the consumer stops
+            while not stop.is_set():
+                try:
+                    items.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            self.local.process_id = process_id       # preprocess of the stage uses process id of the load
+            try:
+                for item in iterable:
+                    if not put((item, None)):
+                        return
+                put((done, None))
+            except BaseException as Error:
+                put((done, Error))
+            finally:
+                getattr(iterable, 'close', lambda: None)()     # stops previous stages of a stopped pipeline
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        try:
+            while True:
+                item, error = items.get()
+                if error is not None:
+                    raise error
+                if item is done:
+                    return
+                yield item
+        finally:
+            stop.set()
+            producer.join()
+
+    def _consumed(self, iterable, stats):
+        # passes items of a pipeline stage, stats gets busy seconds (time until the consumer asks next item), rows and chunks of the consumer
+        for item in iterable:
+            start = time.perf_counter()
+            yield item
+            stats['seconds'] += time.perf_counter() - start
+            stats['rows'] += len(item)
+            stats['chunks'] += 1
+
+    def _timed(self, function, iterable, stats):
+        # map of a pipeline stage, stats gets busy seconds, rows and chunks of the stage
+        for item in iterable:
+            start = time.perf_counter()
+            result = function(item)
+            stats['seconds'] += time.perf_counter() - start
+            stats['rows'] += len(result[-1])
+            stats['chunks'] += 1
+            yield result
+
+    def _read_source(self, source, chunksize, read_csv_kwargs, stats):
+        # (source key, chunk number, dataframe) of a csv/parquet file or an iterable of dataframes, files are read chunk by chunk
+        if isinstance(source, str):
+            key = source
+            if source.lower().endswith('.parquet'):
+                try:
+                    import pyarrow.dataset as ds
+                except ImportError:
+                    raise Exception("pyarrow is needed for parquet sources --> pip install pyarrow")
+                chunks = (batch.to_pandas() for batch in ds.dataset(source, format='parquet').to_batches(batch_size=chunksize))
+            else:
+                chunks = pd.read_csv(source, chunksize=chunksize, **(read_csv_kwargs or {}))
+        else:
+            key, chunks = 'frames', iter(source)
+        number = 0
+        while True:
+            start = time.perf_counter()
+            chunk = next(chunks, None)
+            if chunk is None:
+                break
+            stats['seconds'] += time.perf_counter() - start
+            stats['rows'] += len(chunk)
+            stats['chunks'] += 1
+            yield key, number, chunk
+            number += 1
+
+    def _spilled(self, paths):
+        # dataframes of an iterator which were pickled during analyze, one in memory at a time
+        for path in paths:
+            yield pd.read_pickle(path)
+
+    def _load_table(self, table_name, sources, schema=None, dtype=None, chunksize=100_000, queue_size=4, texts_buffer=20, resume=True,
+                    if_exists='append', insert_method='auto', read_csv_kwargs=None, date_normalizer=True, text_cutter=True):
+        # staged pipeline of one table : parse --> (analyze + create_dtypes) --> parse --> preprocess --> insert (+ chunk progress)
+        stages = {stage: {'rows': 0, 'chunks': 0, 'seconds': 0.0} for stage in ('parse', 'analyze', 'ddl', 'preprocess', 'insert')}
+        start = time.perf_counter()
+        sources = sources if isinstance(sources, (list, tuple)) else [sources]
+        sources = [[source] if isinstance(source, pd.DataFrame) else source for source in sources]
+
+        with contextlib.ExitStack() as stack:
+            if dtype is None:
+                dtype = self.dtype_registry.get(table_name, schema=schema)
+            if dtype is None:
+                # frames of iterators can be iterated once, they're pickled to a temp directory while they're analyzed
+                spill_dir = stack.enter_context(tempfile.TemporaryDirectory(prefix='pysql_load_'))
+                spilled = {number: [] for number, source in enumerate(sources) if not isinstance(source, str)}
+
+                def parse_all():
+                    for number, source in enumerate(sources):
+                        for _, chunk_number, chunk in self._read_source(source, chunksize, read_csv_kwargs, stages['parse']):
+                            if number in spilled:
+                                spilled[number].append(os.path.join(spill_dir, f'{number}-{chunk_number:08d}.pkl'))
+                                chunk.to_pickle(spilled[number][-1])
+                            yield chunk
+
+                parsed = self._background(parse_all(), queue_size)
+                dtype = Table_analyzer().analyze_chunks(self._consumed(parsed, stages['analyze']), texts_buffer=texts_buffer, pre_analysed_dict={})
+                sources = [self._spilled(spilled[number]) if number in spilled else source for number, source in enumerate(sources)]
+                ddl_start = time.perf_counter()
+                self.create_dtypes(dtype, table_name, schema=schema)
+                stages['ddl']['seconds'] += time.perf_counter() - ddl_start
+            dtypes = dtype | {'process_id':types.INT()}
+
+            # text columns of csv files are read as texts, number-like values keep their original text (e.g. leading zeros)
+            read_csv_kwargs = dict(read_csv_kwargs or {})
+            if read_csv_kwargs.get('dtype') is None or isinstance(read_csv_kwargs['dtype'], dict):
+                text_columns = {column: str for column, sql_type in dtype.items() if isinstance(sql_type, types.String) or
+                                (isinstance(sql_type, type) and issubclass(sql_type, types.String))}
+                read_csv_kwargs['dtype'] = text_columns | (read_csv_kwargs.get('dtype') or {})
+
+            load_names = {source if isinstance(source, str) else f'frames:{number}': f'load:{schema}.{table_name}:' + (source if isinstance(source, str) else f'frames:{number}')
+                          for number, source in enumerate(sources)}
+            done_chunks, total_rows = {}, {key: 0 for key in load_names}
+            if resume and if_exists != 'replace':
+                for key, load_name in load_names.items():
+                    stored = self.read_watermark(load_name)
+                    if stored is not None:
+                        if stored['watermark_column'] != f'chunk/{chunksize}':
+                            raise Exception(f"{load_name} was loaded by {stored['watermark_column']}, use same chunksize or reset_watermark('{load_name}')")
+                        done_chunks[key], total_rows[key] = int(stored['watermark']), int(stored['rows'])
+            else:
+                for load_name in load_names.values():
+                    self.reset_watermark(load_name)
+            self.create_watermarks_table()
+
+            def read_all():
+                for number, source in enumerate(sources):
+                    key = source if isinstance(source, str) else f'frames:{number}'
+                    for _, chunk_number, chunk in self._read_source(source, chunksize, read_csv_kwargs, stages['parse']):
+                        if chunk_number > done_chunks.get(key, -1):
+                            yield key, chunk_number, chunk
+
+            def prepare(item):
+                key, chunk_number, chunk = item
+                return key, chunk_number, self.preprocess(chunk, date_normalizer=date_normalizer, text_cutter=text_cutter, dtypes=dtypes)
+
+            prepared = self._background(self._timed(prepare, self._background(read_all(), queue_size), stages['preprocess']), queue_size)
+            replace = if_exists == 'replace'
+            rows = 0
+            for key, chunk_number, df in prepared:
+                insert_start = time.perf_counter()
+                total_rows[key] += len(df)
+                with self.engine.begin() as connection:
+                    self.insert(df, table_name, schema=schema, if_exists='replace' if replace else 'append', index=False, insert_method=insert_method, dtypes=dtypes,
+                                connection=connection)
+                    self.write_watermark(load_names[key], f'chunk/{chunksize}', chunk_number, total_rows[key], connection=connection)
+                self.table_written(table_name, schema)
+                replace = False
+                rows += len(df)
+                stages['insert']['seconds'] += time.perf_counter() - insert_start
+                stages['insert']['rows'] += len(df)
+                stages['insert']['chunks'] += 1
+        for stats in stages.values():
+            stats['rows_per_sec'] = stats['rows'] / stats['seconds'] if stats['seconds'] and stats['rows'] else None
+        return {'rows': rows, 'seconds': time.perf_counter() - start, 'stages': stages}
+
+    @_log_decorator
+    def load_files(self, sources, schema=None, dtypes=None, chunksize=100_000, workers=4, queue_size=4, texts_buffer=20, resume=True, if_exists='append',
+                   insert_method='auto', read_csv_kwargs=None, date_normalizer=True, text_cutter=True):
+        """
+        loads files (csv/parquet) or iterators of dataframes into tables by staged pipelines, tables are loaded in parallel
+        stages of a table overlap through bounded queues : parse --> analyze (Table_analyzer.analyze_chunks) --> create_dtypes --> parse --> preprocess --> insert
+        (analyze and create_dtypes run only for tables without stored dtypes, files are parsed twice then, dataframes of iterators are pickled to a temp directory)
+        parquet files are read by batches (needs pyarrow), text columns of csv files are read as texts after analyze
+        every chunk is inserted in one transaction with its progress ('config'.'watermarks', 'load:schema.table:source'),
+        so a failed load continues from its next chunk with resume=True (same chunksize is needed)
+
+        Args:
+            sources (dict or list): {table_name: file path, list of file paths or iterable of dataframes} or file paths (table name is file name)
+            schema (str): target schema name default=None
+            dtypes (dict, optional): {table_name: {column_name: sqlalchemy type}} (default is None --> stored dtypes or analyzed)
+            chunksize (int): rows of each chunk default=100_000
+            workers (int): tables loaded in parallel default=4
+            queue_size (int): max waiting chunks between stages default=4
+            texts_buffer (int/float): see Table_analyzer.analyze default=20
+            resume (bool): skip chunks loaded before default=True
+            if_exists (str): append/replace (replace drops the table and progress of its sources) default=append
+            insert_method, date_normalizer, text_cutter: same as PySQL.to_sql
+            read_csv_kwargs (dict, optional): pandas.read_csv params, e.g. {'sep': ';'}
+
+        Returns:
+            dict: {table_name: {'rows', 'seconds', 'stages': {stage: {'rows', 'chunks', 'seconds', 'rows_per_sec'}}} or {'error'}}
+            (also stored in PySQL.load_report, an Exception is raised after all tables when a table failed)
+
+        Examples:
+            >>> pysql.load_files(glob.glob('drop/*.csv'), schema='Stage', workers=8)
+        """
+        if if_exists not in ('append', 'replace'):
+            raise Exception(f"if_exists of load_files must be append or replace, not {if_exists}")
+        if not isinstance(sources, dict):
+            sources = {os.path.splitext(os.path.basename(path))[0]: path for path in sources}
+        dtypes = dtypes or {}
+        process_id = self.current_process_id()
+        self.load_report = report = {}
+
+        def load(table_name):
+            self.local.process_id = process_id
+            try:
+                return self._load_table(table_name, sources[table_name], schema=schema, dtype=dtypes.get(table_name), chunksize=chunksize, queue_size=queue_size,
+                                        texts_buffer=texts_buffer, resume=resume, if_exists=if_exists, insert_method=insert_method, read_csv_kwargs=read_csv_kwargs,
+                                        date_normalizer=date_normalizer, text_cutter=text_cutter)
+            finally:
+                self.local.process_id = None
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(load, table_name): table_name for table_name in sources}
+            for future in as_completed(futures):
+                try:
+                    report[futures[future]] = future.result()
+                except Exception as Error:
+                    report[futures[future]] = {'error': f'{type(Error).__name__}: {Error}'}
+                self.logger('load_files', 'progress', f"{futures[future]}: {report[futures[future]].get('rows', report[futures[future]].get('error'))}")
+        failed = [table_name for table_name, result in report.items() if 'error' in result]
+        if failed:
+            raise Exception(f"load_files failed for {', '.join(failed)} (see PySQL.load_report), run it again to resume")
+        return report
+
+    def portable_dtypes(self, table_name, schema=None):
+        """
+        column types of a table which can be stored in files (Dtype_registry.dtypes_to_json) : stored dtypes of the table over its reflected
+        column types, reflected dialect types (e.g. sql server BIT/DATETIME2) are taken as their generic sqlalchemy types
+
+        Args:
+            table_name (str): target table name
+            schema (str): target schema name default=None
+
+        Returns:
+            dict: {column_name: sqlalchemy type} (in order of table columns)
+        """
+        sql_types = {}
+        for column in self.metadata_cache.get_columns(table_name, schema=schema):
+            sql_type = column['type']
+            if not isinstance(getattr(types, type(sql_type).__name__, None), type):
+                try:
+                    sql_type = sql_type.as_generic()
+                except NotImplementedError:
+                    sql_type = types.NVARCHAR()
+            sql_types[column['name']] = sql_type
+        try:
+            stored = self.fetch_dtypes(table_name, schema=schema)
+        except Exception:
+            stored = {}
+        return sql_types | {column: dtype for column, dtype in stored.items() if column in sql_types}
+
+    def arrow_schema(self, table, sql_types):
+        # schema of the first arrow batch, columns which are all null in it get the arrow type of their sql type (later batches are cast to it)
+        import pyarrow as pa
+        fields = []
+        for field in table.schema:
+            dtype = self.sql_type_to_dtype(sql_types.get(field.name), dtype_backend='pyarrow') if pa.types.is_null(field.type) else None
+            fields.append(pa.field(field.name, dtype.pyarrow_dtype) if dtype is not None else field)
+        return pa.schema(fields)
+
+    @_log_decorator
+    def export_parquet(self, table_name, path, schema=None, columns=None, fetch_size=100_000, rows_per_file=1_000_000, partition_cols=None,
+                       compression='snappy', queue_size=2):
+        """
+        streams a table to a directory of parquet files with bounded memory (needs pyarrow)
+        rows are fetched by PySQL.stream_sql_table (fetch_size rows each time, fetch overlaps writing), every fetch is a row group.
+        column types (stored 'config'.'dtypes' of the table over its column types, PySQL.portable_dtypes) are kept in the file metadata,
+        so PySQL.import_parquet creates the same column types
+
+        Args:
+            table_name (str): source table name
+            path (str): directory of parquet files (created, must be empty)
+            schema (str): source schema name default=None
+            columns (list): columns to export default=None (all columns)
+            fetch_size (int): rows of each fetch and row group default=100_000
+            rows_per_file (int): a new file is started after this many rows default=1_000_000
+            partition_cols (list, optional): hive partitions (path/column=value/...) of these columns instead of numbered files default=None
+            compression (str): parquet compression (snappy, zstd, gzip, none) default=snappy
+            queue_size (int): max fetched batches waiting for the writer default=2
+
+        Returns:
+            dict: {'table', 'schema', 'rows', 'files', 'seconds'}
+
+        Examples:
+            >>> pysql.export_parquet('Test_table', '/data/snapshots/Test_table', schema='Test_schema', rows_per_file=5_000_000)
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise Exception("pyarrow is needed for export_parquet --> pip install pyarrow")
+        if os.path.isdir(path) and os.listdir(path):
+            raise Exception(f'{path} is not empty, export to a new directory')
+        os.makedirs(path, exist_ok=True)
+        start = time.perf_counter()
+        sql_types = self.portable_dtypes(table_name, schema=schema)
+        if columns is not None:
+            sql_types = {column: sql_types[column] for column in columns}
+        metadata = {b'pysql': json.dumps({'table': table_name, 'schema': schema, 'process_id': self.current_process_id(),
+                                          'dtypes': Dtype_registry.dtypes_to_json(sql_types)}).encode()}
+        batches = self._background(self.stream_sql_table(table_name, schema=schema, columns=columns, fetch_size=fetch_size, dtype_backend='pyarrow'), queue_size)
+        target_schema, writer, files, rows, file_rows = None, None, [], 0, 0
+        try:
+            for number, batch in enumerate(batches):
+                with self.measure_stage('write'):
+                    table = pa.Table.from_pandas(batch, preserve_index=False)
+                    if target_schema is None:
+                        target_schema = self.arrow_schema(table, sql_types).with_metadata(metadata)
+                    table = table.cast(target_schema)
+                    if partition_cols:
+                        pq.write_to_dataset(table, path, partition_cols=partition_cols, basename_template=f'{table_name}-{number:05d}-{{i}}.parquet',
+                                            existing_data_behavior='overwrite_or_ignore', compression=compression,
+                                            file_visitor=lambda written: files.append(written.path))
+                    else:
+                        if writer is None:
+                            files.append(os.path.join(path, f'{table_name}-{len(files):05d}.parquet'))
+                            writer = pq.ParquetWriter(files[-1], target_schema, compression=compression)
+                        writer.write_table(table, row_group_size=len(table))
+                        file_rows += len(table)
+                        if file_rows >= rows_per_file:
+                            writer.close()
+                            writer, file_rows = None, 0
+                            self.logger('export_parquet', 'progress', f'{files[-1]}: {rows + len(table)} rows')
+                rows += len(table)
+        finally:
+            if writer is not None:
+                writer.close()
+        return {'table': table_name, 'schema': schema, 'rows': rows, 'files': files, 'seconds': time.perf_counter() - start}
+
+    @_log_decorator
+    def import_parquet(self, path, table_name, schema=None, if_exists='append', insert_method='bulk', batch_size=100_000, staging_dir=None,
+                       date_normalizer=True, text_cutter=True, queue_size=2):
+        """
+        loads parquet files (PySQL.export_parquet or any parquet files) into a table in batches with bounded memory (needs pyarrow)
+        column types come from file metadata of PySQL.export_parquet (stored by PySQL.create_dtypes for new/replaced tables), stored dtypes of
+        an existing table or Table_analyzer (files are read twice then). reading and preprocess of next batch overlap insert of a batch.
+        like PySQL.to_sql, process_id column of rows is the process id of this call
+
+        Args:
+            path (str): parquet file or directory of parquet files (hive partitions are read as columns)
+            table_name (str): target table name
+            schema (str): target schema name default=None
+            if_exists (str): append/replace default=append
+            insert_method (str): see PySQL.to_sql default=bulk (staging files must be readable by sql server, see staging_dir and PySQL.write_bulk_file)
+            batch_size (int): rows of each insert default=100_000
+            staging_dir, date_normalizer, text_cutter: same as PySQL.to_sql
+            queue_size (int): max prepared batches waiting for insert default=2
+
+        Returns:
+            dict: {'table', 'schema', 'rows', 'batches', 'seconds'}
+
+        Examples:
+            >>> pysql.import_parquet('/data/snapshots/Test_table', 'Test_table', schema='Restore', if_exists='replace')
+        """
+        try:
+            import pyarrow.dataset as ds
+        except ImportError:
+            raise Exception("pyarrow is needed for import_parquet --> pip install pyarrow")
+        if if_exists not in ('append', 'replace'):
+            raise Exception(f"if_exists of import_parquet must be append or replace, not {if_exists}")
+        start = time.perf_counter()
+        dataset = ds.dataset(path, format='parquet', partitioning='hive')
+        metadata = json.loads(dataset.schema.metadata[b'pysql']) if b'pysql' in (dataset.schema.metadata or {}) else None
+
+        def frames():
+            for batch in dataset.to_batches(batch_size=batch_size):
+                df = batch.to_pandas()
+                for column in df.columns[df.dtypes == 'category']:    # hive partition columns
+                    df[column] = df[column].astype(df[column].cat.categories.dtype)
+                yield df
+
+        if schema is not None and not self.metadata_cache.has_schema(schema):
+            self.create_schema(schema)
+        stored = self.dtype_registry.get(table_name, schema=schema)
+        if stored is not None and not (if_exists == 'replace' and metadata is not None):
+            dtype = stored
+        else:
+            if metadata is not None:
+                dtype = self.dtype_registry.json_to_dtypes(metadata['dtypes'])
+            else:
+                dtype = Table_analyzer().analyze_chunks(frames(), pre_analysed_dict={})
+            dtype = {column: sql_type for column, sql_type in dtype.items() if column != 'process_id'}
+            self.create_dtypes(dtype, table_name, schema=schema)
+        dtypes = dtype | {'process_id':types.INT()}
+
+        rows, batches, replace = 0, 0, if_exists == 'replace'
+        prepared = (self.preprocess(df, date_normalizer=date_normalizer, text_cutter=text_cutter, dtypes=dtypes) for df in frames())
+        for df in self._background(prepared, queue_size):
+            self.insert(df, table_name, schema=schema, if_exists='replace' if replace else 'append', index=False, insert_method=insert_method,
+                        staging_dir=staging_dir, dtypes=dtypes)
+            replace = False
+            rows += len(df)
+            batches += 1
+        return {'table': table_name, 'schema': schema, 'rows': rows, 'batches': batches, 'seconds': time.perf_counter() - start}
+
     @_log_decorator
-    def set_primary_key(self, table_name, schema=None, column_name=None):
+    def set_primary_key(self, table_name, schema=None, column_name=None, dtypes=None):
         """
          set the table primary key
              -just one time allowed (if PK exists error!)
@@ -430,7 +3061,8 @@ class PySQL():
         Args:
             table_name (str): target table name
             schema (str): target schema name default=None
-            column_name (str): column name what you want to be primary key
+            column_name (str or list): column name (or names) what you want to be primary key
+            dtypes (dict, optional): {column_name: sqlalchemy type} (default is None --> PySQL.dtypes)
             
         Returns:
             None
@@ -438,53 +3070,172 @@ class PySQL():
         if schema != None:
             table_name = f'{schema}.{table_name}'
             
-        primary_key_dtype = str(self.dtypes[column_name])
-        QUERY = f"""ALTER TABLE {table_name} alter column {column_name} {primary_key_dtype} NOT NULL"""
-        self.engine.execute(QUERY)   
-        QUERY = f"""ALTER TABLE {table_name}
-                    ADD PRIMARY KEY ({column_name});"""
-        self.engine.execute(QUERY)
+        column_names = [column_name] if isinstance(column_name, str) else list(column_name)
+        with self.measure_stage('ddl'):
+            for column_name in column_names:
+                primary_key_dtype = str((self.dtypes if dtypes is None else dtypes)[column_name])
+                QUERY = f"""ALTER TABLE {table_name} alter column {column_name} {primary_key_dtype} NOT NULL"""
+                self.engine.execute(QUERY)   
+            column_name = ', '.join(column_names)
+            QUERY = f"""ALTER TABLE {table_name}
+                        ADD PRIMARY KEY ({column_name});"""
+            self.engine.execute(QUERY)
         print('primary key sets on {column_name} with out any error')
+        self.metadata_cache.invalidate(schema, table_name.split('.')[-1])
+        self.table_written(table_name.split('.')[-1], schema)
         
     @_log_decorator 
     def create_dtypes(self, dtype_dict, table_name, schema=None):
-        def dtype_to_string(dtype_dict):
-            dtype_dict_stringed = {}
-            for dtype in dtype_dict.keys():
-                dtype_string = 'types.' + str(dtype_dict[dtype]) if '(' in str(dtype_dict[dtype]) else 'types.'+ str(dtype_dict[dtype]) +'()'
-                dtype_string.replace('BOOLEAN', 'Boolean')
-                dtype_dict_stringed = dtype_dict_stringed | {dtype:dtype_string}
-            return dtype_dict_stringed
-        
-        dtype_dict = dtype_to_string(dtype_dict)
-        dtype_df = pd.DataFrame([{'table':table_name, 'schema':schema, 'dtypes_str':str(dtype_dict), 'proccess_id':self.process_id}])
+        """
+        stores table dtypes in 'config'.'dtypes' (json) and PySQL.dtype_registry
+
+        Args:
+            dtype_dict (dict): {column_name: sqlalchemy type} (Table_analyzer.analyze result is suggested)
+            table_name (str): target table name
+            schema (str): target schema name default=None
+
+        Returns:
+            None
+        """
+        dtypes_str = Dtype_registry.dtypes_to_json(dtype_dict)
+        dtype_df = pd.DataFrame([{'table':table_name, 'schema':schema, 'dtypes_str':dtypes_str, 'proccess_id':self.current_process_id()}])
+        if not self.metadata_cache.has_table('dtypes', 'config'):
+            with self.dtypes_table_lock:    # concurrent loads (PySQL.load_files) would all create the table
+                if not self.metadata_cache.has_table('dtypes', 'config'):
+                    dtype_df.head(0).to_sql('dtypes', con=self.engine, schema='config', if_exists='append', dtype=self.dtypes_types, index=True)
+                    self.metadata_cache.add_table('dtypes', 'config')
         dtype_df.to_sql('dtypes', con=self.engine, schema='config', if_exists='append', dtype=self.dtypes_types, index=True)
+        self.dtype_registry.set(table_name, schema, dtype_dict, self.current_process_id())
 
 
         
     @_log_decorator   
     def load_dtypes(self, table_name, schema=None):
+        """
+        sets PySQL.dtypes to stored dtypes of a table (from PySQL.dtype_registry, without a query when it's preloaded)
+        PySQL.dtypes is shared by all threads, concurrent calls should use PySQL.fetch_dtypes or to_sql(dtype=...) instead
+        (to_sql takes the stored dtypes of its target table anyway)
+
+        Args:
+            table_name (str): target table name
+            schema (str): target schema name default=None
+
+        Returns:
+            None
+        """
+        self.dtypes = self.fetch_dtypes(table_name, schema=schema)
+
+    def fetch_dtypes(self, table_name, schema=None):
+        """
+        returns stored dtypes of a table from PySQL.dtype_registry (without changing PySQL.dtypes)
+
+        Args:
+            table_name (str): target table name
+            schema (str): target schema name default=None
+
+        Returns:
+            dict: {column_name: sqlalchemy type}
+        """
         try:
-            if schema == None:
-                select_query = f"""SELECT TOP (1) [table]
-                                        ,[schema]
-                                        ,[dtypes_str]
-                                    FROM [config].[dtypes]
-                                    where [table] = '{table_name}'
-                                ORDER BY [proccess_id] DESC"""
-            else:
-                select_query = f"""SELECT TOP (1) [table]
-                                        ,[schema]
-                                        ,[dtypes_str] 
-                                    FROM [config].[dtypes]
-                                    where [table] = '{table_name}' and [schema] = '{schema}'
-                                    ORDER BY [proccess_id] DESC"""
-            self.dtypes = pd.read_sql_query(select_query, con=self.engine)
-            self.dtypes = self.dtypes.to_dict('records')[0]['dtypes_str']
-            self.dtypes = eval(self.dtypes)
-            self.dtypes = {i:eval(self.dtypes[i].replace('BOOLEAN', 'Boolean')) for i in self.dtypes} 
-        except:
+            dtypes = self.dtype_registry.get(table_name, schema=schema)
+        except Exception:
+            dtypes = None
+        if dtypes is None:
             self.Error = "can't load dtypes table from database please try run PySQL.create_dtypes() first.  using Table_analyzer is suggested :) "
             raise Exception(self.Error)
-       
-        
+        return dtypes
+
+
+class Async_PySQL():
+    server_limits = weakref.WeakKeyDictionary()     # {event loop: {server: asyncio.Semaphore}} shared by Async_PySQL objects
+
+    def __init__(self, pysql, max_concurrency=16, max_loads=4, max_workers=None):
+        """
+        asyncio counterparts of PySQL methods, blocking calls run on a bounded thread pool so the event loop is never blocked
+        calls of one server wait (backpressure) when max_concurrency calls are running on it, big loads (to_sql) have their own
+        max_loads limit so they can't take all slots of small queries
+        (engine pool_size + max_overflow of PySQL.create_connection should be max_concurrency + max_loads or more)
+
+        Args:
+            pysql (PySQL): connected PySQL object
+            max_concurrency (int, optional): max running queries/calls per server (default is 16)
+            max_loads (int, optional): max running to_sql loads of this object (default is 4)
+            max_workers (int, optional): thread pool size (default is None --> max_concurrency + max_loads)
+
+        Examples:
+            >>> async with Async_PySQL(pysql, max_concurrency=32) as apysql:
+            ...     frames = await asyncio.gather(*[apysql.read_sql_query(query) for query in queries])
+        """
+        self.pysql = pysql
+        self.max_concurrency = max_concurrency
+        self.max_loads = max_loads
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or max_concurrency + max_loads, thread_name_prefix='pysql_async')
+        self.load_limits = weakref.WeakKeyDictionary()   # {event loop: asyncio.Semaphore}
+        self.server = getattr(pysql, 'server', None) or str(pysql.engine.url)
+
+    def server_limit(self):
+        # concurrency limit of the server in the running event loop
+        server_limits = self.server_limits.setdefault(asyncio.get_running_loop(), {})
+        if self.server not in server_limits:
+            server_limits[self.server] = asyncio.Semaphore(self.max_concurrency)
+        return server_limits[self.server]
+
+    def load_limit(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self.load_limits:
+            self.load_limits[loop] = asyncio.Semaphore(self.max_loads)
+        return self.load_limits[loop]
+
+    async def run(self, method, *args, load=False, **kwargs):
+        """
+        runs a PySQL method on the thread pool under the server limit (and the load limit)
+
+        Args:
+            method (str): PySQL method name, e.g. 'tables_list'
+            load (bool, optional): it's a big load (default is False)
+
+        Returns:
+            result of the method
+        """
+        call = functools.partial(getattr(self.pysql, method), *args, **kwargs)
+        async with contextlib.AsyncExitStack() as limits:
+            if load:
+                await limits.enter_async_context(self.load_limit())
+            await limits.enter_async_context(self.server_limit())
+            return await asyncio.get_running_loop().run_in_executor(self.executor, call)
+
+    async def to_sql(self, df, table_name, *args, **kwargs):
+        # see PySQL.to_sql
+        return await self.run('to_sql', df, table_name, *args, load=True, **kwargs)
+
+    async def read_sql_query(self, query, *args, **kwargs):
+        # see PySQL.read_sql_query
+        return await self.run('read_sql_query', query, *args, **kwargs)
+
+    async def read_sql_table(self, table_name, *args, **kwargs):
+        # see PySQL.read_sql_table
+        return await self.run('read_sql_table', table_name, *args, **kwargs)
+
+    async def load_dtypes(self, table_name, schema=None):
+        # returns stored dtypes of a table (PySQL.fetch_dtypes), PySQL.dtypes shared by all calls is not changed
+        return await self.run('fetch_dtypes', table_name, schema=schema)
+
+    async def logger(self, func, state, log, process_id=None):
+        # see PySQL.logger, async log mode only puts the record in the queue so it's not sent to the thread pool
+        if self.pysql.log_mode == 'async':
+            return self.pysql.logger(func, state, log, process_id=process_id)
+        return await self.run('logger', func, state, log, process_id=process_id)
+
+    async def flush_logs(self, timeout=30):
+        # see PySQL.flush_logs
+        return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(self.pysql.flush_logs, timeout=timeout))
+
+    async def close(self):
+        # waits for running calls and stops the thread pool
+        await asyncio.get_running_loop().run_in_executor(None, functools.partial(self.executor.shutdown, wait=True))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
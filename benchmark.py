@@ -0,0 +1,240 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import create_engine, event, types
+from PySQL import PySQL, Table_analyzer, Metadata_cache, Dtype_registry
+
+
+STAGES = ['analyze', 'to_sql', 'to_sql_raw', 'read_sql_table', 'logger', 'log_decorator']
+
+
+def make_frame(rows, seed=0):
+    """
+    creates a synthetic dataframe with mixed column types (bit, int, bigint, float, text, date, datetime)
+
+    Args:
+        rows (int): number of rows
+        seed (int, optional): random seed (default is 0)
+
+    Returns:
+        pandas dataframe
+    """
+    rng = np.random.default_rng(seed)
+    words = np.array(['alpha', 'beta', 'gamma', 'delta', 'déjà vu', 'x' * 40], dtype=object)
+    df = pd.DataFrame({
+        'flag': rng.integers(0, 2, rows),
+        'flag_text': rng.choice(np.array(['True', 'False', '1', '0'], dtype=object), rows),
+        'small_int': rng.integers(-1000, 1000, rows),
+        'big_int': rng.integers(0, 5_000_000_000, rows),
+        'int_with_nulls': rng.integers(0, 100, rows).astype(float),
+        'float': rng.random(rows),
+        'text': rng.choice(words, rows) + pd.Series(rng.integers(0, 10_000, rows)).astype(str).to_numpy(dtype=object),
+        'date': pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 1000, rows), unit='D'),
+        'datetime': pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 10**8, rows), unit='s'),
+    })
+    df.loc[df.index[::7], 'int_with_nulls'] = np.nan
+    df.loc[df.index[::5], 'text'] = None
+    return df
+
+
+def sqlite_pysql(directory, schemas=('config', 'data'), log_mode='sync'):
+    """
+    creates a PySQL object on a local SQLite database (stand-in of sql server), every schema is an attached database file
+
+    Args:
+        directory (str): directory of database files
+        schemas (tuple, optional): attached schemas (default is ('config', 'data'))
+        log_mode (str, optional): see PySQL.set_log_mode (default is 'sync')
+
+    Returns:
+        PySQL object
+    """
+    engine = create_engine(f"sqlite:///{os.path.join(directory, 'main.db')}")
+
+    @event.listens_for(engine, 'connect')
+    def attach_schemas(dbapi_connection, connection_record):
+        for schema in schemas:
+            dbapi_connection.execute(f"ATTACH DATABASE '{os.path.join(directory, schema + '.db')}' AS {schema}")
+
+    pysql = PySQL()
+    pysql.engine = engine
+    pysql.username = 'benchmark'
+    pysql.log_dtypes['datetime'] = types.VARCHAR(19)    # sqlite DATETIME accepts datetime objects only, logger sends text
+    pysql.log_file = os.path.join(directory, 'pysql_log.csv')
+    pysql.metadata_cache = Metadata_cache(engine)
+    pysql.dtype_registry = Dtype_registry(engine)
+    pysql.dtype_registry.load()
+    pysql.set_log_mode(log_mode, log_file=pysql.log_file)
+    return pysql
+
+
+def percentiles(timings):
+    # p50/p95/p99 of seconds
+    return {f'p{q}': float(np.percentile(timings, q)) for q in (50, 95, 99)}
+
+
+def measure(stage, rows, function, repeat=3, calls=1, memory=True):
+    """
+    runs function repeat times and reports its timings, then runs it once more under tracemalloc for peak memory
+
+    Args:
+        stage (str): stage name
+        rows (int): rows handled by every run (throughput = rows / seconds)
+        function (callable): stage (without args)
+        repeat (int, optional): timed runs (default is 3)
+        calls (int, optional): calls of every run, latencies are per call (default is 1)
+        memory (bool, optional): measure peak memory (default is True)
+
+    Returns:
+        dict: stage, rows, repeat, best/mean seconds, rows per second, latency percentiles and peak memory
+    """
+    timings = []
+    for _ in range(repeat):
+        for _ in range(calls):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+    run_seconds = [sum(timings[i:i + calls]) for i in range(0, len(timings), calls)]
+    peak_memory = None
+    if memory:
+        tracemalloc.start()
+        function()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    best = min(run_seconds)
+    return {'stage': stage, 'rows': rows, 'repeat': repeat, 'calls': calls, 'seconds': best, 'mean_seconds': float(np.mean(run_seconds)),
+            'rows_per_sec': rows / best if best else None, **percentiles(timings), 'peak_memory_bytes': peak_memory}
+
+
+def bench_analyzer(rows, repeat=3, n_jobs=1, chunksize=None, memory=True):
+    """
+    times Table_analyzer.analyze (or analyze_chunks when chunksize is given) on a synthetic dataframe
+
+    Returns:
+        dict: see measure
+    """
+    df = make_frame(rows)
+    analyzer = Table_analyzer()
+    if chunksize:
+        function = lambda: analyzer.analyze_chunks((df.iloc[i:i + chunksize] for i in range(0, rows, chunksize)), pre_analysed_dict={}, n_jobs=n_jobs)
+    else:
+        function = lambda: analyzer.analyze(df, pre_analysed_dict={}, n_jobs=n_jobs)
+    return measure('analyze_chunks' if chunksize else 'analyze', rows, function, repeat=repeat, memory=memory)
+
+
+def bench_pysql(pysql, rows, repeat=3, stages=STAGES, insert_method='auto', log_calls=1000, memory=True):
+    """
+    times PySQL stages on a synthetic dataframe
+        -to_sql: with date_normalizer and text_cutter
+        -to_sql_raw: without date_normalizer and text_cutter
+        -read_sql_table: reads the written table
+        -logger / log_decorator: per call overhead (log_calls calls in every run, rows is ignored)
+
+    Returns:
+        list: dicts, see measure
+    """
+    df = make_frame(rows).drop(columns=['flag_text'])    # sqlite BOOLEAN accepts bool/int values only
+    dtype = Table_analyzer().analyze(df, pre_analysed_dict={})
+    results = []
+
+    def write(**kwargs):
+        if pysql.to_sql(df, 'bench', schema='data', if_exists='replace', index=False, insert_method=insert_method, dtype=dtype, **kwargs) is None:
+            raise Exception('to_sql failed, see PySQL logs')
+
+    if 'to_sql' in stages:
+        results.append(measure('to_sql', rows, write, repeat=repeat, memory=memory))
+    if 'to_sql_raw' in stages:
+        results.append(measure('to_sql_raw', rows, lambda: write(date_normalizer=False, text_cutter=False), repeat=repeat, memory=memory))
+    if 'read_sql_table' in stages:
+        if not pysql.metadata_cache.has_table('bench', 'data'):
+            write()
+        results.append(measure('read_sql_table', rows, lambda: pysql.read_sql_table('bench', schema='data'), repeat=repeat, memory=memory))
+    if 'logger' in stages:
+        results.append(measure('logger', log_calls, lambda: pysql.logger('benchmark', 'progress', 'success'), repeat=repeat, calls=log_calls, memory=False))
+    if 'log_decorator' in stages:
+        noop = PySQL._log_decorator(lambda self: None)
+        results.append(measure('log_decorator', log_calls, lambda: noop(pysql), repeat=repeat, calls=log_calls, memory=False))
+    pysql.flush_logs()
+    return results
+
+
+def environment():
+    # versions of the run, results are comparable between same environments
+    return {'datetime': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(), 'platform': platform.platform(),
+            'pandas': pd.__version__, 'numpy': np.__version__, 'sqlalchemy': sqlalchemy.__version__}
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    finds stages which are slower than baseline results (same stage and rows)
+
+    Args:
+        results (list): results of this run
+        baseline (list): results of another run (e.g. before upgrading)
+        tolerance (float, optional): allowed slowdown ratio (default is 0.2 --> 20%)
+
+    Returns:
+        list: dicts of stage, rows, baseline and current seconds and ratio
+    """
+    baseline = {(result['stage'], result['rows']): result for result in baseline}
+    regressions = []
+    for result in results:
+        old = baseline.get((result['stage'], result['rows']))
+        if old and old['seconds'] and result['seconds'] > old['seconds'] * (1 + tolerance):
+            regressions.append({'stage': result['stage'], 'rows': result['rows'], 'baseline_seconds': old['seconds'],
+                                'seconds': result['seconds'], 'ratio': result['seconds'] / old['seconds']})
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='PySQL benchmarks (local SQLite database as sql server stand-in)')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000, 10_000, 100_000], help='e.g. 1000 100000 10000000')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--stages', nargs='+', default=STAGES, choices=STAGES)
+    parser.add_argument('--jobs', type=int, default=1, help='analyzer worker processes')
+    parser.add_argument('--chunksize', type=int, default=None, help='analyze in chunks of this size')
+    parser.add_argument('--insert-method', default='auto', help='to_sql insert_method')
+    parser.add_argument('--log-mode', default='sync', choices=['sync', 'async', 'file'])
+    parser.add_argument('--log-calls', type=int, default=1000, help='calls of every logger/log_decorator run')
+    parser.add_argument('--no-memory', action='store_true', help="don't measure peak memory (tracemalloc run)")
+    parser.add_argument('--directory', default=None, help='directory of sqlite files (default is a temp directory)')
+    parser.add_argument('--output', default=None, help='write results as json to this file')
+    parser.add_argument('--compare', default=None, help='json results of another run, exits with 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown ratio of --compare')
+    args = parser.parse_args()
+
+    directory = args.directory or tempfile.mkdtemp(prefix='pysql_benchmark_')
+    pysql = sqlite_pysql(directory, log_mode=args.log_mode)
+    results = []
+    for rows in args.rows:
+        if 'analyze' in args.stages:
+            results.append(bench_analyzer(rows, repeat=args.repeat, n_jobs=args.jobs, chunksize=args.chunksize, memory=not args.no_memory))
+        results += bench_pysql(pysql, rows, repeat=args.repeat, stages=args.stages, insert_method=args.insert_method,
+                               log_calls=args.log_calls, memory=not args.no_memory)
+    pysql.close_logs()
+
+    for result in results:
+        memory = f"{result['peak_memory_bytes'] / 1024 ** 2:,.1f}MB" if result['peak_memory_bytes'] is not None else '-'
+        print(f"{result['stage']:<15} rows={result['rows']:<10} seconds={result['seconds']:.4f} rows/sec={result['rows_per_sec']:,.0f} "
+              f"p50={result['p50']:.6f} p95={result['p95']:.6f} p99={result['p99']:.6f} peak={memory}", file=sys.stderr)
+    report = {'environment': environment(), 'args': vars(args), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    else:
+        print(json.dumps(report))
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(results, json.load(baseline)['results'], tolerance=args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression['stage']} rows={regression['rows']} {regression['baseline_seconds']:.4f}s --> {regression['seconds']:.4f}s", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,17 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from benchmark import sqlite_pysql
+
+
+@pytest.fixture
+def pysql(tmp_path):
+    # PySQL on a local SQLite database, schemas are attached database files
+    pysql = sqlite_pysql(str(tmp_path), schemas=('config', 'data', 'restore'))
+    pysql.raise_errors = True
+    yield pysql
+    pysql.close_logs()
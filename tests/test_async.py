@@ -0,0 +1,60 @@
+import asyncio
+import threading
+import time
+
+import pandas as pd
+from sqlalchemy import types
+
+from PySQL import Async_PySQL
+
+
+def test_gather_loads_and_queries(pysql):
+    frames = {f'async_{i}': pd.DataFrame({'id': range(i * 10, i * 10 + 10)}) for i in range(6)}
+
+    async def main():
+        async with Async_PySQL(pysql, max_concurrency=4, max_loads=2) as apysql:
+            await asyncio.gather(*[apysql.to_sql(frame, table_name, schema='data', index=False) for table_name, frame in frames.items()])
+            return await asyncio.gather(*[apysql.read_sql_query(f'SELECT id FROM data.{table_name}') for table_name in frames])
+
+    results = asyncio.run(main())
+    for result, frame in zip(results, frames.values()):
+        assert result['id'].tolist() == frame['id'].tolist()
+
+
+def test_calls_wait_for_server_and_load_limits(pysql):
+    running = {'calls': 0, 'max': 0}
+    lock = threading.Lock()
+
+    def slow_call():
+        with lock:
+            running['calls'] += 1
+            running['max'] = max(running['max'], running['calls'])
+        time.sleep(0.05)
+        with lock:
+            running['calls'] -= 1
+
+    pysql.slow_call = slow_call
+
+    async def main(load):
+        async with Async_PySQL(pysql, max_concurrency=3, max_loads=2, max_workers=10) as apysql:
+            await asyncio.gather(*[apysql.run('slow_call', load=load) for _ in range(10)])
+
+    asyncio.run(main(load=False))
+    assert running['max'] == 3
+    running['max'] = 0
+    asyncio.run(main(load=True))
+    assert running['max'] == 2
+
+
+def test_load_dtypes_returns_dtypes_of_every_call(pysql):
+    pysql.create_dtypes({'name': types.NVARCHAR(10)}, 'first', schema='data')
+    pysql.create_dtypes({'name': types.NVARCHAR(20)}, 'second', schema='data')
+    shared_dtypes = dict(pysql.dtypes)
+
+    async def main():
+        async with Async_PySQL(pysql) as apysql:
+            return await asyncio.gather(apysql.load_dtypes('first', schema='data'), apysql.load_dtypes('second', schema='data'))
+
+    first, second = asyncio.run(main())
+    assert (first['name'].length, second['name'].length) == (10, 20)
+    assert pysql.dtypes == shared_dtypes
@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+from sqlalchemy import types
+from sqlalchemy.dialects import mssql
+
+
+def test_bulk_file_rows_end_with_line_feed_and_keep_empty_texts(pysql, tmp_path):
+    path = str(tmp_path / 'staging.csv')
+    df = pd.DataFrame({'text': ['x', '', None, 'a"b\nc'], 'number': [1.5, np.nan, 2, 3], 'flag': [True, False, True, False]})
+    pysql.write_bulk_file(df, path, index=False, dtypes={'text': types.NVARCHAR(10), 'number': types.FLOAT(), 'flag': types.Boolean()})
+    with open(path, 'rb') as staging:
+        assert staging.read() == b'x,1.5,1\n"",,0\n,2.0,1\n"a""b\nc",3.0,0\n'
+
+
+def test_bulk_file_keeps_fractional_seconds_of_datetime_types(pysql, tmp_path):
+    path = str(tmp_path / 'staging.csv')
+    moment = pd.Timestamp('2021-01-01 10:00:00.123456')
+    df = pd.DataFrame({'day': [moment.normalize()], 'small': [moment], 'datetime': [moment], 'datetime2': [moment]}, index=pd.Index([moment], name='at'))
+    pysql.write_bulk_file(df, path, index=True, dtypes={'at': types.DATETIME(), 'day': types.DATE(), 'small': mssql.SMALLDATETIME(),
+                                                         'datetime': types.DATETIME(), 'datetime2': mssql.DATETIME2()})
+    with open(path) as staging:
+        assert staging.read() == '2021-01-01T10:00:00.123,2021-01-01,2021-01-01T10:00:00,2021-01-01T10:00:00.123,2021-01-01T10:00:00.123456\n'
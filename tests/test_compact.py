@@ -0,0 +1,19 @@
+import pandas as pd
+from sqlalchemy import types
+
+
+def test_compact_frame_keeps_values_out_of_declared_int_range(pysql):
+    df = pd.DataFrame({'big': [3_000_000_000, 1], 'small': [1, 2], 'fraction': [1.5, None]})
+    compact = pysql.compact_frame(df, {'big': types.INT(), 'small': types.INT(), 'fraction': types.INT()})
+    assert compact['big'].tolist() == [3_000_000_000, 1]
+    assert compact['big'].dtype == 'int64'
+    assert compact['small'].dtype == 'int32'
+    assert compact['fraction'].dtype == 'float64'
+
+
+def test_compact_types_prefer_reflected_types_over_other_schema_dtypes(pysql):
+    pysql.to_sql(pd.DataFrame({'id': [3_000_000_000]}), 'same_name', index=False, dtype={'id': types.BIGINT()})
+    pysql.create_dtypes({'id': types.INT()}, 'same_name', schema='data')
+    assert isinstance(pysql.compact_types([(None, 'same_name')])['id'], types.BIGINT)
+    df = pysql.read_sql_query('SELECT id FROM same_name', compact=True, cache=False)
+    assert df['id'].tolist() == [3_000_000_000]
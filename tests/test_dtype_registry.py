@@ -0,0 +1,121 @@
+import pandas as pd
+import pytest
+from sqlalchemy import event, inspect, types
+from sqlalchemy.dialects import mssql
+
+from PySQL import Dtype_registry
+
+
+def count_queries(engine):
+    queries = []
+    event.listen(engine, 'before_cursor_execute', lambda conn, cursor, statement, *args: queries.append(statement))
+    return queries
+
+
+def as_text(dtype_dict):
+    return {column: repr(dtype) for column, dtype in dtype_dict.items()}
+
+
+def test_json_round_trip():
+    dtype_dict = {'name': types.NVARCHAR(53), 'amount': types.FLOAT(precision=53), 'id': types.INTEGER,
+                  'day': types.DATETIME(timezone=True), 'price': types.DECIMAL(18, 4), 'flag': types.Boolean()}
+    json_str = Dtype_registry.dtypes_to_json(dtype_dict)
+    assert '"name":["NVARCHAR",{"length":53}]' in json_str
+    parsed = Dtype_registry(None).json_to_dtypes(json_str)
+    assert as_text(parsed) == as_text({column: dtype() if isinstance(dtype, type) else dtype for column, dtype in dtype_dict.items()})
+
+
+def test_old_format_is_parsed_without_eval():
+    registry = Dtype_registry(None)
+    parsed = registry.json_to_dtypes("{'name': 'types.NVARCHAR(53)', 'amount': 'types.FLOAT(precision=53)', 'flag': 'types.BOOLEAN()'}")
+    assert as_text(parsed) == as_text({'name': types.NVARCHAR(53), 'amount': types.FLOAT(precision=53), 'flag': types.Boolean()})
+    with pytest.raises(Exception):
+        registry.json_to_dtypes("{'name': 'types.NVARCHAR(__import__(\"os\").getcwd())'}")
+    with pytest.raises(Exception, match='unknown sqlalchemy type'):
+        registry.json_to_dtypes('{"name": ["create_engine", {}]}')
+
+
+def test_preloaded_dtypes_need_no_query(pysql):
+    pysql.create_dtypes({'name': types.NVARCHAR(20), 'id': types.INTEGER()}, 'customers', schema='data')
+    pysql.create_dtypes({'name': types.NVARCHAR(40), 'id': types.INTEGER()}, 'customers', schema='data')
+    registry = Dtype_registry(pysql.engine)
+    registry.load()
+    queries = count_queries(pysql.engine)
+    assert as_text(registry.get('customers', schema='data')) == as_text({'name': types.NVARCHAR(40), 'id': types.INTEGER()})
+    assert queries == []
+
+
+def test_missing_table_is_queried_once(pysql):
+    registry = Dtype_registry(pysql.engine)
+    queries = count_queries(pysql.engine)
+    assert registry.get('nothing', schema='data') is None
+    assert registry.get('nothing', schema='data') is None
+    assert len(queries) == 1
+
+
+def test_missing_table_needs_no_query_after_load(pysql):
+    registry = Dtype_registry(pysql.engine)
+    registry.load()
+    queries = count_queries(pysql.engine)
+    for _ in range(3):
+        assert registry.get('nothing', schema='data') is None
+    assert queries == []
+    pysql.create_dtypes({'id': types.INTEGER()}, 'nothing', schema='data')      # by another process
+    registry.invalidate('nothing', schema='data')
+    assert as_text(registry.get('nothing', schema='data')) == as_text({'id': types.INTEGER()})
+
+
+def test_tables_without_schema_use_the_default_schema(pysql):
+    pysql.create_dtypes({'name': types.NVARCHAR(20)}, 'customers', schema='data')
+    pysql.create_dtypes({'name': types.NVARCHAR(30)}, 'customers')
+    registry = Dtype_registry(pysql.engine)
+    registry.load()
+    assert registry.get('customers')['name'].length == 30
+    assert registry.get('customers', schema='main')['name'].length == 30       # sqlite default schema
+    assert registry.get('customers', schema='data')['name'].length == 20
+    registry.invalidate('customers')
+    assert registry.get('customers')['name'].length == 30
+
+
+def test_repeated_to_sql_doesnt_query_stored_dtypes(pysql):
+    pysql.create_dtypes({'name': types.NVARCHAR(20)}, 'customers', schema='data')
+    pysql.dtype_registry.load()
+    queries = count_queries(pysql.engine)
+    for _ in range(3):
+        pysql.to_sql(pd.DataFrame({'name': ['a']}), 'customers', index=False)
+        pysql.to_sql(pd.DataFrame({'name': ['a']}), 'no_dtypes', schema='data', index=False)
+    assert not [query for query in queries if 'dtypes' in query and 'config' in query]
+    columns = {column['name']: column['type'] for column in inspect(pysql.engine).get_columns('customers')}
+    assert getattr(columns['name'], 'length', None) != 20      # dtypes of data.customers aren't used for main.customers
+
+
+def test_to_sql_uses_stored_dtypes(pysql):
+    pysql.create_dtypes({'name': types.NVARCHAR(20), 'id': types.INTEGER()}, 'customers', schema='data')
+    pysql.to_sql(pd.DataFrame({'name': ['a', 'b'], 'id': [1, 2]}), 'customers', schema='data', index=False)
+    columns = {column['name']: column['type'] for column in inspect(pysql.engine).get_columns('customers', schema='data')}
+    assert isinstance(columns['name'], types.NVARCHAR) and columns['name'].length == 20
+    assert isinstance(columns['id'], types.INTEGER)
+
+
+def test_dialect_types_and_collations_round_trip():
+    registry = Dtype_registry(None)
+    dtype_dict = {'created': mssql.DATETIME2(precision=3), 'flag': mssql.BIT(), 'name': types.NVARCHAR(53, collation='Arabic_CI_AS')}
+    parsed = registry.json_to_dtypes(Dtype_registry.dtypes_to_json(dtype_dict))
+    assert as_text(parsed) == as_text(dtype_dict)
+    assert parsed['name'].collation == 'Arabic_CI_AS'
+    old = registry.json_to_dtypes("""{'name': 'types.NVARCHAR(53) COLLATE "Arabic_CI_AS"', 'note': 'types.NVARCHAR COLLATE "Persian_100_CI_AI"()', 'created': 'types.DATETIME2()'}""")
+    assert (old['name'].length, old['name'].collation) == (53, 'Arabic_CI_AS')
+    assert (old['note'].length, old['note'].collation) == (None, 'Persian_100_CI_AI')
+    assert isinstance(old['created'], mssql.DATETIME2)
+
+
+def test_unreadable_rows_are_skipped_with_a_warning(pysql):
+    pysql.create_dtypes({'created': mssql.DATETIME2(), 'id': types.INTEGER()}, 'events', schema='data')
+    bad_rows = pd.DataFrame([{'table': 'events', 'schema': 'data', 'dtypes_str': "{'id': 'types.NOT_A_TYPE()'}", 'proccess_id': 10 ** 6},
+                             {'table': 'broken', 'schema': 'data', 'dtypes_str': '{not json', 'proccess_id': 10 ** 6}])
+    bad_rows.to_sql('dtypes', pysql.engine, schema='config', if_exists='append', index=False)
+    registry = Dtype_registry(pysql.engine)
+    with pytest.warns(RuntimeWarning, match='skipped'):
+        registry.load()
+    assert as_text(registry.get('events', schema='data')) == as_text({'created': mssql.DATETIME2(), 'id': types.INTEGER()})
+    assert registry.get('broken', schema='data') is None
@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+from sqlalchemy import types
+
+
+def frame(rows=2500):
+    return pd.DataFrame({'id': range(rows), 'name': [f'name {i}' for i in range(rows)], 'price': [i / 4 for i in range(rows)]})
+
+
+@pytest.mark.parametrize('insert_method', ['auto', 'fast_executemany', 'multi_values', 'default'])
+def test_to_sql_insert_methods_write_every_row(pysql, insert_method):
+    pysql.dtypes = {'id': types.INT(), 'name': types.NVARCHAR(20), 'price': types.FLOAT()}
+    pysql.to_sql(frame(), 'prices', schema='data', if_exists='replace', index=False, insert_method=insert_method)
+    assert pysql.insert_report['rows'] == 2500
+    written = pd.read_sql_query('SELECT id, name, price FROM data.prices ORDER BY id', pysql.engine)
+    pd.testing.assert_frame_equal(written, frame())
+
+
+def test_to_sql_with_callable_insert_method(pysql):
+    calls = []
+
+    def insert(pd_table, conn, keys, data_iter):
+        rows = list(data_iter)
+        calls.append(len(rows))
+        conn.execute(pd_table.table.insert(), [dict(zip(keys, row)) for row in rows])
+
+    pysql.to_sql(frame(10), 'prices', schema='data', if_exists='replace', index=False, insert_method=insert, chunksize=4)
+    assert calls == [4, 4, 2]
+    assert pysql.insert_report['insert_method'] == 'insert'
+
+
+def test_multi_values_batches_stay_under_parameters_limit(pysql):
+    df = frame().assign(**{f'extra_{i}': 0 for i in range(27)})
+    method, chunksize = pysql.insert_plan(df, insert_method='multi_values', index=False)
+    assert method == 'multi'
+    assert chunksize * len(df.columns) < pysql.max_parameters
+    assert chunksize <= pysql.max_values_rows
+
+
+def test_unknown_insert_method_raises(pysql):
+    with pytest.raises(Exception, match='unknown insert_method'):
+        pysql.insert_plan(frame(), insert_method='bcp')
@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+
+
+def test_load_files_keeps_texts_of_mixed_csv_chunks(pysql, tmp_path):
+    path = tmp_path / 'codes.csv'
+    path.write_text('code,n\n' + '\n'.join(['1234567890123,1'] * 1000 + ['AB,2'] * 10 + ['0042,3']) + '\n')
+    report = pysql.load_files([str(path)], schema='data', chunksize=500, texts_buffer=0.2)
+    assert report['codes']['rows'] == 1011
+    codes = pysql.read_sql_table('codes', schema='data')['code'].value_counts()
+    assert codes.to_dict() == {'1234567890123': 1000, 'AB': 10, '0042': 1}
+
+
+def test_load_files_reads_parquet_and_frames_in_chunks(pysql, tmp_path):
+    path = tmp_path / 'big.parquet'
+    pd.DataFrame({'a': np.arange(20_000), 'b': ['x'] * 20_000}).to_parquet(path, row_group_size=5_000)
+    frames = (pd.DataFrame({'a': np.arange(i * 100, (i + 1) * 100), 't': ['y' * (i + 1)] * 100}) for i in range(5))
+    report = pysql.load_files({'big': str(path), 'frames': frames}, schema='data', chunksize=5_000)
+    assert report['big']['rows'] == 20_000
+    assert report['big']['stages']['insert']['chunks'] == 4
+    assert report['frames']['rows'] == 500
+    assert sorted(pysql.read_sql_table('frames', schema='data')['t'].unique()) == ['y' * (i + 1) for i in range(5)]
@@ -0,0 +1,12 @@
+import pandas as pd
+
+
+def test_logs_after_close_logs_are_not_lost(pysql):
+    pysql.set_log_mode('async', flush_interval=60)
+    pysql.logger('before_close', 'progress', 'success')
+    pysql.close_logs()
+    assert pysql.log_mode == 'sync'
+    pysql.logger('after_close', 'progress', 'success')
+    assert pysql.log_queue.qsize() == 0
+    functions = pd.read_sql_query('SELECT function FROM config.log', pysql.engine)['function'].tolist()
+    assert functions[-2:] == ['before_close', 'after_close']
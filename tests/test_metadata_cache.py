@@ -0,0 +1,51 @@
+import pandas as pd
+from sqlalchemy import event
+
+from PySQL import Metadata_cache
+
+
+def count_queries(engine):
+    queries = []
+    event.listen(engine, 'before_cursor_execute', lambda conn, cursor, statement, *args: queries.append(statement))
+    return queries
+
+
+def test_lookups_are_cached(pysql):
+    pysql.engine.execute('CREATE TABLE data.t1 (id INTEGER)')
+    cache = Metadata_cache(pysql.engine)
+    queries = count_queries(pysql.engine)
+    assert cache.has_schema('data') and cache.has_table('t1', 'data')
+    assert [column['name'] for column in cache.get_columns('t1', 'data')] == ['id']
+    reflected = len(queries)
+    for _ in range(3):
+        assert cache.has_schema('data') and cache.has_table('t1', 'data')
+        cache.get_columns('t1', 'data')
+    assert len(queries) == reflected
+    assert cache.stats()['hits'] == 9 and cache.stats()['misses'] == 3
+
+
+def test_missing_names_are_reloaded_and_invalidate_drops_columns(pysql):
+    cache = Metadata_cache(pysql.engine)
+    assert not cache.has_table('t2', 'data')
+    pysql.engine.execute('CREATE TABLE data.t2 (id INTEGER)')     # created out of PySQL
+    assert cache.has_table('t2', 'data')
+    assert [column['name'] for column in cache.get_columns('t2', 'data')] == ['id']
+    pysql.engine.execute('ALTER TABLE data.t2 ADD COLUMN name TEXT')
+    assert [column['name'] for column in cache.get_columns('t2', 'data')] == ['id']
+    cache.invalidate('data', 't2')
+    assert [column['name'] for column in cache.get_columns('t2', 'data')] == ['id', 'name']
+
+
+def test_entries_expire_after_ttl(pysql):
+    cache = Metadata_cache(pysql.engine, ttl=0)
+    cache.schema_names()
+    cache.schema_names()
+    assert cache.stats()['hits'] == 0 and cache.stats()['misses'] == 2
+
+
+def test_to_sql_updates_the_cache_without_reflection(pysql):
+    pysql.to_sql(pd.DataFrame({'id': [1]}), 'new_table', schema='data', index=False)
+    assert 'new_table' in pysql.metadata_cache.table_names('data')
+    misses = pysql.metadata_cache.stats()['misses']
+    assert pysql.metadata_cache.has_table('new_table', 'data')
+    assert pysql.metadata_cache.stats()['misses'] == misses
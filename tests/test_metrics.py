@@ -0,0 +1,46 @@
+import pandas as pd
+import pytest
+
+from PySQL import Metrics
+
+
+def test_counters_and_histograms():
+    metrics = Metrics(buckets=[0.1, 0.2, 0.4, 0.8])
+    for seconds in (0.05, 0.15, 0.15, 0.3, 0.5, 2.0):
+        metrics.observe('call.seconds', seconds)
+    metrics.count('call.rows_in', 10)
+    metrics.count('call.rows_in', 5)
+    snapshot = metrics.snapshot()
+    histogram = snapshot['histograms']['call.seconds']
+    assert snapshot['counters'] == {'call.rows_in': 15}
+    assert (histogram['count'], histogram['min'], histogram['max']) == (6, 0.05, 2.0)
+    assert histogram['mean'] == pytest.approx(3.15 / 6)
+    assert histogram['p50'] == 0.2 and histogram['p99'] == 2.0      # bucket upper bounds, overflow bucket gives max
+    assert metrics.percentile('unknown', 50) is None
+    metrics.reset()
+    assert metrics.snapshot() == {'counters': {}, 'histograms': {}}
+
+
+def test_logged_calls_are_measured(pysql):
+    pysql.to_sql(pd.DataFrame({'id': range(100), 'name': ['a'] * 100}), 'measured', schema='data', index=False)
+    pysql.read_sql_table('measured', schema='data')
+    snapshot = pysql.metrics.snapshot()
+    assert snapshot['counters']['to_sql.calls'] == 1
+    assert snapshot['counters']['to_sql.rows_in'] == 100
+    assert snapshot['counters']['read_sql_table.rows_out'] == 100
+    assert 'to_sql.errors' not in snapshot['counters']
+    for stage in ('seconds', 'preprocess.seconds', 'insert.seconds'):
+        assert snapshot['histograms'][f'to_sql.{stage}']['count'] == 1
+
+
+def test_failed_calls_are_counted_and_always_exported(pysql):
+    pysql.to_sql(pd.DataFrame({'id': range(10)}), 'measured', schema='data', index=False)
+    records = []
+    pysql.set_metrics_exporter(records.append, sample_rate=0)
+    pysql.read_sql_table('measured', schema='data')          # sampled out
+    assert records == []
+    with pytest.raises(Exception):
+        pysql.read_sql_table('missing_table', schema='data')
+    assert pysql.metrics.snapshot()['counters']['read_sql_table.errors'] == 1
+    assert [record['state'] for record in records] == ['error']
+    assert records[0]['error']
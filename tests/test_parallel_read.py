@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def table(pysql):
+    rows = 1000
+    pysql.engine.execute('CREATE TABLE data.parts (id INTEGER PRIMARY KEY, amount FLOAT, day DATETIME)')
+    frame = pd.DataFrame({
+        'id': np.arange(rows) ** 2,                                  # skewed : range partitions are not equal
+        'amount': [None if i % 9 == 0 else i / 3 for i in range(rows)],
+        'day': pd.date_range('2020-01-01', periods=rows, freq='h'),
+    })
+    frame.to_sql('parts', pysql.engine, schema='data', if_exists='append', index=False)
+    pysql.metadata_cache.invalidate('data')
+    return frame
+
+
+@pytest.mark.parametrize('split', ['range', 'ntile'])
+@pytest.mark.parametrize('partition_column', [None, 'amount', 'day'])
+def test_parallel_read_equals_one_read(pysql, table, split, partition_column):
+    expected = pd.read_sql('SELECT * FROM data.parts', pysql.engine, parse_dates=['day'])
+    result = pysql.read_sql_table_parallel('parts', partition_column=partition_column, schema='data', partitions=5, workers=3,
+                                           split=split, parse_dates=['day'])
+    assert len(result) == len(expected)
+    order = partition_column or 'id'
+    sort = lambda frame: frame.sort_values(['id']).reset_index(drop=True)
+    pd.testing.assert_frame_equal(sort(result), sort(expected), check_dtype=False)
+    if partition_column != 'amount':                                 # null partition of amount is read last
+        assert result[order].is_monotonic_increasing
+
+
+def test_every_row_is_in_one_partition(pysql, table):
+    partitions = dict(pysql.iter_sql_table_partitions('parts', partition_column='amount', schema='data', partitions=4))
+    assert len(partitions) == 5                                      # 4 ranges + IS NULL
+    ids = pd.concat(partitions.values())['id']
+    assert ids.is_unique and len(ids) == len(table)
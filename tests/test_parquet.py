@@ -0,0 +1,35 @@
+import pandas as pd
+import pytest
+from sqlalchemy import types
+
+pytest.importorskip('pyarrow')
+
+
+def test_parquet_round_trip_keeps_types_and_milliseconds(pysql, tmp_path):
+    df = pd.DataFrame({'id': range(3), 'name': ['a', '', None], 'price': [1.5, 2.25, None], 'note': ['x' * 5000, 'b', None],
+                       'at': pd.to_datetime(['2021-01-01 10:00:00.123', '2021-06-30 23:59:59.997', '2022-01-01 00:00:00.001'])})
+    dtype = {'id': types.BIGINT(), 'name': types.NVARCHAR(10), 'price': types.FLOAT(), 'note': types.NVARCHAR(), 'at': types.DATETIME()}
+    pysql.create_dtypes(dtype, 'source', schema='data')
+    pysql.to_sql(df, 'source', schema='data', index=False)
+
+    exported = pysql.export_parquet('source', str(tmp_path / 'source'), schema='data', fetch_size=2)
+    assert exported['rows'] == 3
+    imported = pysql.import_parquet(str(tmp_path / 'source'), 'target', schema='restore', insert_method='auto', batch_size=2)
+    assert imported['rows'] == 3
+
+    assert {column: repr(sql_type) for column, sql_type in pysql.fetch_dtypes('target', schema='restore').items()} == \
+           {column: repr(sql_type) for column, sql_type in dtype.items()}
+    source = pysql.read_sql_table('source', schema='data').drop(columns='process_id')
+    target = pysql.read_sql_table('target', schema='restore').drop(columns='process_id')
+    pd.testing.assert_frame_equal(target, source)
+    assert pd.to_datetime(target['at']).dt.microsecond.tolist() == [123000, 997000, 1000]
+
+
+def test_bulk_staging_of_parquet_batches_keeps_milliseconds(pysql, tmp_path):
+    df = pd.DataFrame({'at': pd.to_datetime(['2021-01-01 10:00:00.123'])})
+    pysql.create_dtypes({'at': types.DATETIME()}, 'source', schema='data')
+    pysql.to_sql(df, 'source', schema='data', index=False)
+    pysql.export_parquet('source', str(tmp_path / 'source'), schema='data')
+    batch = pd.read_parquet(tmp_path / 'source')
+    pysql.write_bulk_file(batch, str(tmp_path / 'staging.csv'), index=False, dtypes={'at': types.DATETIME(), 'process_id': types.INT()})
+    assert (tmp_path / 'staging.csv').read_text().startswith('2021-01-01T10:00:00.123,')
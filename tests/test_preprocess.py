@@ -0,0 +1,29 @@
+import pandas as pd
+from sqlalchemy import types
+
+
+def test_date_normalizer_reports_changed_values(pysql):
+    df = pd.DataFrame({'aware': pd.to_datetime(['2021-01-01 10:00', None, '2021-01-02 11:30']).tz_localize('UTC'),
+                       'minutes': pd.to_datetime(['2021-01-01 00:15', '2021-01-02 00:00', None]),
+                       'days': pd.to_datetime(['2021-01-01', '2021-01-02', '2021-01-03'])})
+    report = []
+    result = pysql.date_normalizer(df, report=report, dtypes={column: types.DATETIME() for column in df.columns})
+    assert {stats['column']: stats['changed'] for stats in report} == {'aware': 2, 'minutes': 0, 'days': 0}
+    assert result['aware'].dt.tz is None
+    assert df['aware'].dt.tz is not None
+
+
+def test_text_cutter_skips_unsized_texts(pysql):
+    df = pd.DataFrame({'note': ['x' * 5000, None, 12], 'code': ['abcdef', 'ab', None]})
+    report = []
+    result = pysql.text_cutter(df, report=report, dtypes={'note': types.NVARCHAR(), 'code': types.VARCHAR(3)})
+    assert {stats['column']: stats['changed'] for stats in report} == {'note': 0, 'code': 1}
+    assert result['note'].tolist() == ['x' * 5000, None, '12']
+    assert result['code'].tolist() == ['abc', 'ab', None]
+    assert pysql.estimate_row_width(df, index=False, dtypes={'note': types.NVARCHAR(), 'code': types.VARCHAR(3)}) == 2 * 255 + 3
+
+
+def test_to_sql_with_unsized_text_dtype(pysql):
+    df = pd.DataFrame({'id': [1, 2], 'note': ['x' * 5000, 'short']})
+    pysql.to_sql(df, 'notes', schema='data', index=False, dtype={'id': types.INTEGER(), 'note': types.NVARCHAR()})
+    assert pysql.read_sql_table('notes', schema='data')['note'].str.len().tolist() == [5000, 5]
@@ -0,0 +1,33 @@
+import pandas as pd
+import pytest
+
+from PySQL import Query_cache
+
+
+@pytest.mark.parametrize('sql, tables', [
+    ('SELECT a.id FROM data.t1 a, data.t2 b WHERE a.id = b.id', {('data', 't1'), ('data', 't2')}),
+    ('SELECT * FROM [data].[t1] WITH (NOLOCK) JOIN t2 ON 1 = 1', {('data', 't1'), (None, 't2')}),
+    ('SELECT * FROM t1 AS x, (SELECT id FROM t3) s, t4 ORDER BY 1', {(None, 't1'), (None, 't3'), (None, 't4')}),
+    ('SELECT * FROM t1 CROSS APPLY (SELECT TOP 1 * FROM t2 WHERE t2.id = t1.id) z', {(None, 't1'), (None, 't2')}),
+    ('SELECT 1', set()),
+    ('SELECT * FROM dbo.table_function(1)', None),
+    ('EXEC dbo.procedure', None),
+])
+def test_referenced_tables(sql, tables):
+    assert Query_cache.referenced_tables(sql) == tables
+
+
+def test_write_to_a_comma_joined_table_invalidates_cached_result(pysql):
+    pysql.to_sql(pd.DataFrame({'id': range(20)}), 't1', schema='data', index=False)
+    pysql.to_sql(pd.DataFrame({'id': range(20)}), 't2', schema='data', index=False)
+    pysql.enable_query_cache()
+    query = 'SELECT a.id FROM data.t1 a, data.t2 b WHERE a.id = b.id'
+    assert len(pysql.read_sql_query(query)) == 20
+    pysql.to_sql(pd.DataFrame({'id': range(10)}), 't2', schema='data', if_exists='replace', index=False)
+    assert len(pysql.read_sql_query(query)) == 10
+
+
+def test_results_of_unparsed_queries_are_not_cached(pysql):
+    pysql.enable_query_cache()
+    pysql.read_sql_query("SELECT 1 AS one FROM pragma_table_info('t1')")
+    assert pysql.query_cache.stats()['entries'] == 0
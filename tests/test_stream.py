@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+
+def make_table(pysql, rows=25):
+    frame = pd.DataFrame({
+        'id': range(rows),
+        'amount': [None if i % 5 == 0 else float(i) for i in range(rows)],
+        'name': [None if i % 7 == 0 else f'name {i}' for i in range(rows)],
+    })
+    pysql.to_sql(frame, 'stream_table', schema='data', index=False)
+    return frame
+
+
+def test_stream_sql_table_yields_bounded_batches(pysql):
+    frame = make_table(pysql)
+    batches = list(pysql.stream_sql_table('stream_table', schema='data', fetch_size=10))
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    result = pd.concat(batches, ignore_index=True)
+    assert result['id'].tolist() == frame['id'].tolist()
+    assert np.allclose(result['amount'].astype(float), frame['amount'], equal_nan=True)
+
+
+def test_batches_have_the_same_dtypes(pysql):
+    make_table(pysql)
+    batches = list(pysql.stream_sql_table('stream_table', schema='data', fetch_size=5))
+    # batch 0 has nulls in amount and name, batch 1 has none : dtypes must not depend on the batch content
+    assert all(batch.dtypes.to_dict() == batches[0].dtypes.to_dict() for batch in batches)
+    assert pd.api.types.is_integer_dtype(batches[0]['id'])
+
+
+def test_stream_sql_query_with_params_and_columns(pysql):
+    make_table(pysql)
+    batches = list(pysql.stream_sql_query('SELECT id FROM data.stream_table WHERE id >= :id', params={'id': 20}, fetch_size=2))
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    columns = list(pysql.stream_sql_table('stream_table', schema='data', columns=['name'], fetch_size=100))
+    assert list(columns[0].columns) == ['name']
+
+
+def test_stopped_stream_reads_no_more_rows(pysql):
+    make_table(pysql)
+    stream = pysql.stream_sql_table('stream_table', schema='data', fetch_size=10)
+    assert len(next(stream)) == 10
+    stream.close()
+
+
+def end_logs(pysql, function):
+    logs = pd.read_sql_query("SELECT log FROM config.log WHERE function = :function AND state = 'end'", pysql.engine, params={'function': function})
+    return logs['log'].tolist()
+
+
+def test_chunksize_reads_log_the_fetch(pysql):
+    make_table(pysql)
+    chunks = pysql.read_sql_table('stream_table', schema='data', chunksize=10)
+    assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+    assert '25 rows' in end_logs(pysql, 'read_sql_table')
+
+    chunks = pysql.read_sql_query('SELECT id FROM data.stream_table', chunksize=10, compact=True)
+    assert len(next(chunks)) == 10
+    chunks.close()
+    assert 'stopped after 10 rows' in end_logs(pysql, 'read_sql_query')
@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+
+
+def add_source_rows(pysql, seqs):
+    frame = pd.DataFrame({'seq': seqs, 'name': [f'row {seq}' for seq in seqs]})
+    frame.to_sql('source', pysql.engine, schema='data', if_exists='append', index=False)
+
+
+def target_seqs(pysql):
+    return pd.read_sql('SELECT seq FROM data.target ORDER BY seq', pysql.engine)['seq'].tolist()
+
+
+def test_sync_copies_new_rows_and_advances_the_watermark(pysql):
+    add_source_rows(pysql, [1, 2, 2, 2, 3, 4, 5, 5])
+    pysql.metadata_cache.invalidate('data')
+    result = pysql.sync_table('source', 'target', watermark_column='seq', source_schema='data', target_schema='data', chunksize=3)
+    # chunk of 3 rows is widened to its last value : [1, 2, 2, 2], [3, 4, 5, 5]
+    assert result == {'rows': 8, 'chunks': 2, 'watermark': 5}
+    assert target_seqs(pysql) == [1, 2, 2, 2, 3, 4, 5, 5]
+    stored = pysql.read_watermark('data.source->data.target')
+    assert (stored['watermark_column'], stored['watermark'], stored['rows']) == ('seq', '5', 8)
+
+    assert pysql.sync_table('source', 'target', watermark_column='seq', source_schema='data', target_schema='data') == {'rows': 0, 'chunks': 0, 'watermark': 5}
+
+    add_source_rows(pysql, [6, 7])
+    result = pysql.sync_table('source', 'target', watermark_column='seq', source_schema='data', target_schema='data')
+    assert result == {'rows': 2, 'chunks': 1, 'watermark': 7}
+    assert target_seqs(pysql) == [1, 2, 2, 2, 3, 4, 5, 5, 6, 7]
+    assert pysql.read_watermark('data.source->data.target')['rows'] == 10
+
+
+def test_reset_watermark_and_changed_column(pysql):
+    add_source_rows(pysql, [1, 2])
+    pysql.metadata_cache.invalidate('data')
+    pysql.sync_table('source', 'target', watermark_column='seq', source_schema='data', target_schema='data', sync_name='copy')
+    with pytest.raises(Exception, match='use reset_watermark'):
+        pysql.sync_table('source', 'target', watermark_column='name', source_schema='data', target_schema='data', sync_name='copy')
+    pysql.reset_watermark('copy')
+    assert pysql.read_watermark('copy') is None
+    pysql.sync_table('source', 'target', watermark_column='seq', source_schema='data', target_schema='data', sync_name='copy')
+    assert target_seqs(pysql) == [1, 1, 2, 2]
@@ -0,0 +1,105 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import types
+
+from PySQL import Table_analyzer
+
+
+def csv_file(column, values):
+    return column + '\n' + '\n'.join(values) + '\n'
+
+
+def as_text(analysed_dict):
+    # sqlalchemy types don't compare by value
+    return {column: repr(dtype) for column, dtype in analysed_dict.items()}
+
+
+def make_frame(rows=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'flag': rng.integers(0, 2, rows), 'number': rng.integers(-10, 10, rows), 'big': rng.integers(0, 5_000_000_000, rows),
+                       'ratio': rng.random(rows), 'text': rng.choice(np.array(['a', 'bb', 'déjà vu'], dtype=object), rows),
+                       'day': pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 100, rows), unit='D')})
+    df.loc[df.index[::7], 'ratio'] = np.nan
+    df.loc[df.index[::5], 'text'] = None
+    return df
+
+
+MIXED_CSVS = {
+    'codes_then_texts': csv_file('code', ['1234567890123'] * 1000 + ['AB'] * 10),
+    'texts_then_codes': csv_file('code', ['AB'] * 10 + ['1234567890123'] * 1000),
+    'floats_then_texts': csv_file('price', ['12345.678'] * 700 + ['n/a'] * 5),
+    'ints_then_floats': csv_file('amount', ['7'] * 600 + ['7.5'] * 100),
+    'ints_then_nulls': csv_file('id', ['3000000000'] * 600 + [''] * 600),
+}
+BOOL_NUMBER_CSVS = {
+    'ints_then_bools': (csv_file('c', ['5', '6', 'True', 'False']), 2),
+    'bools_then_codes': (csv_file('c', ['True', 'False', '007', '1']), 2),
+    'floats_then_bools': (csv_file('c', ['1.0', '0.0', 'True', 'False']), 2),
+    'floats_then_bools_with_nulls': (csv_file('c', ['1.0'] * 6 + ['True', 'False', 'False'] + ['True'] * 3 + [''] * 5), 7),
+}
+# parsed numbers of a chunk can print shorter or longer than their csv texts ('007' --> 7, '1' of a float chunk --> 1.0),
+# so text lengths are compared on fixed columns only
+RANDOM_TOKENS = ['True', 'False', '0', '1', '5', '007', '1.0', '0.0', '2.5', '-3', '', 'AB', '2020-01-01']
+
+
+def test_analyze_in_processes_matches_one_process():
+    df = make_frame()
+    analyzer = Table_analyzer()
+    assert as_text(analyzer.analyze(df, pre_analysed_dict={}, n_jobs=2)) == as_text(analyzer.analyze(df, pre_analysed_dict={}))
+
+
+def test_analyze_chunks_matches_analyze():
+    df = make_frame()
+    analyzer = Table_analyzer()
+    chunks = (df.iloc[start:start + 300] for start in range(0, len(df), 300))
+    assert as_text(analyzer.analyze_chunks(chunks, pre_analysed_dict={})) == as_text(analyzer.analyze(df, pre_analysed_dict={}))
+
+
+def test_merge_profiles_of_int_and_float_chunks():
+    analyzer = Table_analyzer()
+    merged = analyzer.merge_profiles(analyzer.profile_column(pd.Series([1, 2, 3])), analyzer.profile_column(pd.Series([4.0, None])))
+    assert (merged['count'], merged['null_count'], merged['min'], merged['max']) == (4, 1, 1, 4.0)
+    assert merged['is_integral'] and not merged['is_bool']
+    assert merged['dtype'] == np.float64
+
+
+@pytest.mark.parametrize('name', sorted(MIXED_CSVS))
+def test_analyze_chunks_matches_analyze_on_mixed_dtype_chunks(name):
+    analyzer = Table_analyzer()
+    whole = analyzer.analyze(pd.read_csv(io.StringIO(MIXED_CSVS[name])), pre_analysed_dict={})
+    chunked = analyzer.analyze_chunks(pd.read_csv(io.StringIO(MIXED_CSVS[name]), chunksize=500), pre_analysed_dict={})
+    assert as_text(chunked) == as_text(whole)
+
+
+def test_numeric_profiles_keep_text_lengths():
+    profile = Table_analyzer().profile_column(pd.Series([-12, 345]))
+    assert profile['max_utf8_length'] == 3
+    assert profile['max_utf16_length'] == 6
+
+
+@pytest.mark.parametrize('name', sorted(BOOL_NUMBER_CSVS))
+def test_bools_next_to_numbers_are_texts(name):
+    text, chunksize = BOOL_NUMBER_CSVS[name]
+    analyzer = Table_analyzer()
+    whole = analyzer.analyze(pd.read_csv(io.StringIO(text)), pre_analysed_dict={})
+    chunked = analyzer.analyze_chunks(pd.read_csv(io.StringIO(text), chunksize=chunksize), pre_analysed_dict={})
+    assert as_text(chunked) == as_text(whole)
+    assert repr(whole['c']).startswith('NVARCHAR')
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_analyze_chunks_matches_analyze_on_random_columns(seed):
+    rng = np.random.default_rng(seed)
+    analyzer = Table_analyzer()
+    for _ in range(5):
+        values = list(rng.choice(RANDOM_TOKENS[:rng.integers(2, len(RANDOM_TOKENS) + 1)], rng.integers(1, 40)))
+        text = csv_file('c', values)
+        whole = analyzer.analyze(pd.read_csv(io.StringIO(text)), pre_analysed_dict={})['c']
+        for chunksize in (1, 2, 3, 7):
+            chunked = analyzer.analyze_chunks(pd.read_csv(io.StringIO(text), chunksize=chunksize), pre_analysed_dict={})['c']
+            assert type(chunked) == type(whole), (values, chunksize)
+            if not isinstance(whole, types.NVARCHAR):
+                assert repr(chunked) == repr(whole), (values, chunksize)
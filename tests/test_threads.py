@@ -0,0 +1,66 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from sqlalchemy import inspect, types
+
+
+def test_concurrent_to_sql_keeps_dtypes_of_every_call(pysql):
+    lengths = {f'table_{i}': 10 + i for i in range(8)}
+    for table_name, length in list(lengths.items())[:4]:
+        pysql.create_dtypes({'name': types.NVARCHAR(length), 'id': types.INTEGER()}, table_name, schema='data')
+    shared_dtypes = dict(pysql.dtypes)
+    barrier = threading.Barrier(8)
+
+    def write(item):
+        table_name, length = item
+        frame = pd.DataFrame({'name': [table_name] * 50, 'id': range(50)})
+        dtype = None if length < 14 else {'name': types.NVARCHAR(length), 'id': types.INTEGER()}     # stored dtypes or dtype param
+        barrier.wait()
+        pysql.to_sql(frame, table_name, schema='data', index=False, dtype=dtype)
+        return pysql.insert_report['table']
+
+    with ThreadPoolExecutor(8) as executor:
+        reported_tables = list(executor.map(write, lengths.items()))
+
+    assert reported_tables == list(lengths)                 # insert_report of every thread is its own
+    assert pysql.dtypes == shared_dtypes
+    inspector = inspect(pysql.engine)
+    for table_name, length in lengths.items():
+        columns = {column['name']: column['type'] for column in inspector.get_columns(table_name, schema='data')}
+        assert columns['name'].length == length, table_name
+        assert pd.read_sql(f'SELECT COUNT(*) AS n FROM data.{table_name}', pysql.engine)['n'][0] == 50
+
+
+def test_process_ids_are_unique_across_threads(pysql):
+    with ThreadPoolExecutor(8) as executor:
+        process_ids = list(executor.map(lambda _: pysql.next_process_id(), range(200)))
+    assert len(set(process_ids)) == 200
+
+
+def test_first_logs_of_concurrent_calls_create_the_log_table_once(pysql):
+    barrier = threading.Barrier(8)
+
+    def log(number):
+        barrier.wait()
+        pysql.logger('tests', 'start', f'thread {number}')
+
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(log, range(8)))
+    logs = pd.read_sql("SELECT log FROM config.log WHERE function = 'tests'", pysql.engine)['log']
+    assert sorted(logs) == [f'thread {number}' for number in range(8)]
+
+
+def test_concurrent_loads_create_the_config_tables_once(pysql):
+    barrier = threading.Barrier(8)
+
+    def create(number):
+        barrier.wait()
+        pysql.create_dtypes({'id': types.INTEGER()}, f'table_{number}', schema='data')
+        pysql.create_watermarks_table()
+
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(create, range(8)))
+    tables = pd.read_sql('SELECT "table" FROM config.dtypes', pysql.engine)['table']
+    assert sorted(tables) == [f'table_{number}' for number in range(8)]
+    assert 'watermarks' in inspect(pysql.engine).get_table_names(schema='config')
@@ -0,0 +1,85 @@
+import re
+
+import pandas as pd
+import pytest
+from sqlalchemy import event, inspect
+
+
+def create_target(pysql):
+    pysql.engine.execute('CREATE TABLE data.target (id INTEGER PRIMARY KEY, name TEXT)')
+    pysql.engine.execute("INSERT INTO data.target VALUES (1, 'a'), (2, 'b')")
+    pysql.metadata_cache.invalidate('data')
+
+
+def sqlite_merge(engine, counts=None):
+    # sqlite has no MERGE : the batch runs as INSERT .. ON CONFLICT DO UPDATE and selects the counts of its OUTPUT $action
+    merges = []
+
+    def rewrite(connection, cursor, statement, parameters, context, executemany):
+        if 'MERGE' in statement:
+            merges.append(statement)
+            target = re.search(r'MERGE (\S+)', statement).group(1)
+            source = re.search(r'USING (\S+) AS source', statement).group(1)
+            updated = cursor.execute(f'SELECT COUNT(*) FROM {source} WHERE id IN (SELECT id FROM {target})').fetchone()[0]
+            total = cursor.execute(f'SELECT COUNT(*) FROM {source}').fetchone()[0]
+            cursor.execute(f'INSERT INTO {target} SELECT * FROM {source} WHERE true ON CONFLICT(id) DO UPDATE SET name = excluded.name')
+            inserted, updated = (total - updated, updated) if counts is None else counts
+            statement = f'SELECT {inserted} AS inserted, {updated} AS updated'
+        return statement, parameters
+    event.listen(engine, 'before_cursor_execute', rewrite, retval=True)
+    return merges
+
+
+def stage_tables(pysql):
+    return [name for name in inspect(pysql.engine).get_table_names(schema='data') if '__pysql_stage_' in name]
+
+
+def test_upsert_counts_inserted_and_updated_rows(pysql):
+    create_target(pysql)
+    merges = sqlite_merge(pysql.engine)
+    df = pd.DataFrame({'id': [2, 3, 4], 'name': ['B', 'c', 'd']})
+    assert pysql.upsert(df, 'target', schema='data', index=False) == {'inserted': 2, 'updated': 1}
+    assert len(merges) == 1 and 'OUTPUT $action INTO @actions' in merges[0]
+    result = pd.read_sql('SELECT * FROM data.target ORDER BY id', pysql.engine)
+    assert result['name'].tolist() == ['a', 'B', 'c', 'd']
+    assert pysql.insert_report['inserted'] == 2 and pysql.insert_report['updated'] == 1
+    assert stage_tables(pysql) == []
+
+
+def test_counts_are_read_from_the_merge_result(pysql):
+    create_target(pysql)
+    sqlite_merge(pysql.engine, counts=(1, 0))       # e.g. rows changed by a concurrent writer between staging and MERGE
+    result = pysql.upsert(pd.DataFrame({'id': [2, 3], 'name': ['B', 'c']}), 'target', schema='data', index=False)
+    assert result == {'inserted': 1, 'updated': 0}
+    assert (pysql.insert_report['inserted'], pysql.insert_report['updated']) == (1, 0)
+
+
+def test_stage_table_is_dropped_when_merge_fails(pysql):
+    create_target(pysql)
+    df = pd.DataFrame({'id': [3], 'name': ['c']})
+    with pytest.raises(Exception):
+        pysql.upsert(df, 'target', schema='data', index=False)      # MERGE is not sqlite syntax
+    assert stage_tables(pysql) == []
+    assert pd.read_sql('SELECT COUNT(*) AS n FROM data.target', pysql.engine)['n'][0] == 2
+
+
+@pytest.mark.parametrize('rows_before_failure', [0, 1])
+def test_stage_table_is_dropped_when_staging_insert_fails(pysql, monkeypatch, rows_before_failure):
+    create_target(pysql)
+    insert = pysql.insert
+
+    def failing_insert(df, table_name, **kwargs):
+        if rows_before_failure:
+            insert(df.head(rows_before_failure), table_name, **kwargs)
+        raise Exception('connection lost')
+
+    monkeypatch.setattr(pysql, 'insert', failing_insert)
+    with pytest.raises(Exception, match='connection lost'):
+        pysql.upsert(pd.DataFrame({'id': [3, 4], 'name': ['c', 'd']}), 'target', schema='data', index=False)
+    assert stage_tables(pysql) == []
+
+
+def test_upsert_needs_a_key(pysql):
+    pysql.engine.execute('CREATE TABLE data.no_key (id INTEGER, name TEXT)')
+    with pytest.raises(Exception, match='has no primary key'):
+        pysql.upsert(pd.DataFrame({'id': [1], 'name': ['a']}), 'no_key', schema='data', index=False)